@@ -0,0 +1,89 @@
+"""Compare chunker.Chunker with LangChain's RecursiveCharacterTextSplitter.
+
+Usage: uv run python benchmark_chunker.py [FILE ...]
+
+Without files, runs on generated corpora shaped like our uploads: prose with paragraphs, line-oriented text
+exports, and PDF text with no paragraph breaks.
+"""
+
+import random
+import statistics
+import sys
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chunker import Chunker
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+REPEATS = 3
+
+_WORDS = (
+    "the agent retrieves context from the index and answers with citations while the pipeline embeds "
+    "uploaded documents in batches so that large exports stay responsive under load"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+
+
+def generated_corpora(size: int = 5_000_000) -> dict[str, str]:
+    rng = random.Random(0)
+    prose, lines, flat = [], [], []
+    total = 0
+    while total < size:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 8)))
+        prose.append(paragraph)
+        lines.append(_sentence(rng))
+        flat.append(paragraph)
+        total += len(paragraph)
+    return {
+        "prose": "\n\n".join(prose),
+        "lines": "\n".join(lines * (len(prose) * 5 // max(len(lines), 1) + 1))[:size],
+        "pdf_flat": " ".join(flat),
+    }
+
+
+def _time(fn, text: str) -> tuple[float, list]:
+    best, result = float("inf"), []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _describe(chunks: list[str]) -> str:
+    sizes = [len(chunk) for chunk in chunks] or [0]
+    return f"{len(chunks):>7} chunks  mean {statistics.mean(sizes):>6.0f}  max {max(sizes):>5}"
+
+
+def main(paths: list[str]) -> None:
+    if paths:
+        corpora = {}
+        for path in paths:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                corpora[path] = f.read()
+    else:
+        corpora = generated_corpora()
+
+    langchain = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
+    native = Chunker(CHUNK_SIZE, CHUNK_OVERLAP, unit="chars")
+    native_tokens = Chunker(CHUNK_SIZE // 4, CHUNK_OVERLAP // 4, unit="tokens")
+
+    for name, text in corpora.items():
+        print(f"{name}: {len(text) / 1e6:.1f}M chars")
+        for label, fn in (
+            ("RecursiveCharacterTextSplitter", langchain.split_text),
+            ("Chunker (chars)", native.split_text),
+            ("Chunker (tokens)", native_tokens.split_text),
+        ):
+            seconds, chunks = _time(fn, text)
+            throughput = len(text) / seconds / 1e6
+            print(f"  {label:<31} {seconds * 1000:>8.1f} ms  {throughput:>6.1f}M chars/s  {_describe(chunks)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
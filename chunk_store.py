@@ -0,0 +1,51 @@
+import os
+
+from dotenv import load_dotenv
+
+import repositories
+from local_cache import LRUCache
+
+load_dotenv()
+
+# Chunk text lives in Mongo (collection chunk_texts, keyed by content-hash chunk id) rather than in vector
+# metadata; hot chunks are kept in a per-worker LRU.
+CHUNK_STORE_CACHE_MAX_ENTRIES = int(os.getenv("CHUNK_STORE_CACHE_MAX_ENTRIES", "20000"))
+CHUNK_STORE_CACHE_MAX_BYTES = int(os.getenv("CHUNK_STORE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_local = LRUCache(
+    max_entries=CHUNK_STORE_CACHE_MAX_ENTRIES,
+    max_bytes=CHUNK_STORE_CACHE_MAX_BYTES,
+    sizeof=lambda text: len(text) + 64,
+)
+
+
+async def put_many(chunks: list[dict]) -> None:
+    # Ids are content hashes, so an existing entry already holds the same text.
+    await repositories.save_chunk_texts({chunk["id"]: chunk["text"] for chunk in chunks})
+
+
+async def get_many(ids: list[str]) -> dict[str, str]:
+    found = {}
+    missing = []
+    for chunk_id in ids:
+        text = _local.get(chunk_id)
+        if text is None:
+            missing.append(chunk_id)
+        else:
+            found[chunk_id] = text
+    if missing:
+        fetched = await repositories.get_chunk_texts(missing)
+        for chunk_id, text in fetched.items():
+            _local.set(chunk_id, text)
+        found.update(fetched)
+    return found
+
+
+async def delete_many(ids: list[str]) -> None:
+    for chunk_id in ids:
+        _local.pop(chunk_id)
+    await repositories.delete_chunk_texts(ids)
+
+
+def stats() -> dict:
+    return _local.stats()
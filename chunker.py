@@ -0,0 +1,175 @@
+import os
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+import tokens
+
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# "chars" or "tokens" (estimated with tokens.py); CHUNK_SIZE and CHUNK_OVERLAP are in this unit.
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars").lower()
+
+# Same priority as RecursiveCharacterTextSplitter's defaults: paragraphs, then lines, then words.
+SEPARATORS = ("\n\n", "\n", " ")
+_MAX_SEPARATOR = 2
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+class Chunker:
+    """Splits text into overlapping chunks in a single forward pass.
+
+    Chunks follow RecursiveCharacterTextSplitter's semantics. Each chunk is at most ``chunk_size`` long and
+    ends at the last paragraph, line or word boundary that fits; it is cut mid-word only when a word is
+    longer than a chunk. The next chunk starts at the earliest boundary of the same kind within
+    ``chunk_overlap`` of the previous end, so the overlap is made of whole paragraphs, lines or words.
+    Boundaries are located with C-level ``str.rfind``/``str.find`` inside each window. No intermediate
+    strings are built, and every chunk keeps its character offsets into the source text.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT):
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk unit: {unit}")
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+
+    def split(self, text: str) -> list[Chunk]:
+        spans, _ = self.spans(text, final=True)
+        return [Chunk(text[start:end], start, end) for start, end in spans]
+
+    def split_text(self, text: str) -> list[str]:
+        return [chunk.text for chunk in self.split(text)]
+
+    def spans(self, text: str, final: bool = True) -> tuple[list[tuple[int, int]], int]:
+        """Returns (start, end) spans and the offset where splitting stopped.
+
+        With ``final=False`` the text is treated as a prefix of a longer stream: chunking stops before any
+        chunk whose window could still change once more text arrives, and the caller resumes from the
+        returned offset.
+        """
+        n = len(text)
+        starts = tokens.token_starts(text) if self.unit == "tokens" else None
+        spans: list[tuple[int, int]] = []
+        start = _skip_space(text, 0)
+
+        while start < n:
+            limit = self._window_end(start, n, starts, final)
+            if limit is None:
+                break
+            separator = None
+            if limit >= n:
+                end = n
+            else:
+                end = limit
+                for candidate in SEPARATORS:
+                    position = text.rfind(candidate, start + 1, limit + len(candidate))
+                    if position != -1:
+                        end, separator = position, candidate
+                        break
+
+            stripped_end = end
+            while stripped_end > start and text[stripped_end - 1].isspace():
+                stripped_end -= 1
+            spans.append((start, stripped_end))
+            if end >= n:
+                start = n
+                break
+            start = self._next_start(text, starts, start, end, separator)
+
+        return spans, start
+
+    def _window_end(self, start: int, n: int, starts: list[int] | None, final: bool) -> int | None:
+        if starts is None:
+            limit = start + self.chunk_size
+        else:
+            k = bisect_left(starts, start) + self.chunk_size
+            # The last token of an unfinished stream may be a partial word, so it can't bound a window.
+            limit = starts[k] if k < len(starts) - (0 if final else 1) else n
+        if limit >= n:
+            return n if final else None
+        if not final and limit + _MAX_SEPARATOR > n:
+            # A trailing "\n" could still turn into "\n\n".
+            return None
+        return limit
+
+    def _next_start(self, text: str, starts: list[int] | None, start: int, end: int, separator: str | None) -> int:
+        if starts is None:
+            target = end - self.chunk_overlap
+        else:
+            target = starts[max(bisect_left(starts, end) - self.chunk_overlap, 0)]
+        if target <= start:
+            # The chunk is no longer than the overlap; repeating it would not move forward.
+            return _skip_space(text, end)
+        if separator is None:
+            # Hard cut inside an over-long word: overlap by characters.
+            return target
+        position = text.find(separator, max(target - len(separator), start), end)
+        if position == -1 or position + len(separator) >= end:
+            return _skip_space(text, end)
+        return _skip_space(text, position + len(separator))
+
+
+def _skip_space(text: str, position: int) -> int:
+    n = len(text)
+    while position < n and text[position].isspace():
+        position += 1
+    return position
+
+
+class ChunkStream:
+    """Chunks text that arrives in pieces (decoded blocks, PDF pages), returning chunks once they are final.
+
+    Offsets in the returned chunks are relative to the whole stream, and each chunk records the pages it spans
+    when pages are passed to ``feed``. Only the text after the last emitted chunk's overlap start is buffered.
+    """
+
+    def __init__(self, chunker: Chunker | None = None, window_chars: int = 64 * 1024):
+        self.chunker = chunker or Chunker()
+        self.window_chars = window_chars
+        self._buffer = ""
+        self._base = 0
+        self._pages: list[tuple[int, int]] = []
+
+    def feed(self, text: str, page: int | None = None) -> list[tuple[Chunk, int | None, int | None]]:
+        if page is not None and (not self._pages or self._pages[-1][1] != page):
+            self._pages.append((self._base + len(self._buffer), page))
+        self._buffer += text
+        if len(self._buffer) < self.window_chars:
+            return []
+        return self._drain(final=False)
+
+    def finish(self) -> list[tuple[Chunk, int | None, int | None]]:
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> list[tuple[Chunk, int | None, int | None]]:
+        spans, resume = self.chunker.spans(self._buffer, final=final)
+        chunks = [
+            (
+                Chunk(self._buffer[start:end], self._base + start, self._base + end),
+                self._page_at(self._base + start),
+                self._page_at(self._base + end - 1),
+            )
+            for start, end in spans
+        ]
+        self._buffer = self._buffer[resume:]
+        self._base += resume
+        # Keep only the page marker covering the new buffer start and any after it.
+        i = bisect_right(self._pages, (self._base, float("inf"))) - 1
+        if i > 0:
+            del self._pages[:i]
+        return chunks
+
+    def _page_at(self, offset: int) -> int | None:
+        i = bisect_right(self._pages, (offset, float("inf"))) - 1
+        return self._pages[i][1] if i >= 0 else None
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "8"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into one batched call.
+
+    The first text to arrive opens a window of ``window_ms``. Everything that arrives before it closes, or until
+    ``max_batch_size`` texts are waiting, is sent together and each caller gets its own vector back.
+    """
+
+    def __init__(
+        self,
+        embed_many: Callable[[list[str]], Awaitable[list[list[float]]]],
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+    ):
+        self._embed_many = embed_many
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._batches = 0
+        self._texts = 0
+        self._unique_texts = 0
+        self._full_batches = 0
+        self._largest_batch = 0
+        self._embed_seconds = 0.0
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size or self.window <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # Hold a reference so the task isn't garbage-collected mid-flight.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        # Identical texts in one window are embedded once.
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        started = time.perf_counter()
+        try:
+            vectors = await self._embed_many(texts)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        except BaseException:
+            # Cancelled (e.g. on shutdown): callers must not wait forever on futures nobody will resolve.
+            for _, future in batch:
+                future.cancel()
+            raise
+        finally:
+            self._record(len(batch), len(texts), time.perf_counter() - started)
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def _record(self, size: int, unique: int, seconds: float) -> None:
+        self._batches += 1
+        self._texts += size
+        self._unique_texts += unique
+        self._largest_batch = max(self._largest_batch, size)
+        self._embed_seconds += seconds
+        if size >= self.max_batch_size:
+            self._full_batches += 1
+
+    def stats(self) -> dict:
+        batches = self._batches or 1
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self._batches,
+            "texts": self._texts,
+            "unique_texts": self._unique_texts,
+            "avg_batch_size": round(self._texts / batches, 2),
+            "avg_fill": round(self._texts / (batches * self.max_batch_size), 4),
+            "full_batches": self._full_batches,
+            "largest_batch": self._largest_batch,
+            "avg_embed_ms": round(1000 * self._embed_seconds / batches, 2),
+        }
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+from typing import Awaitable, Callable
+
+import numpy as np
+from dotenv import load_dotenv
+
+import redis_cache
+from local_cache import LRUCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Shared tier in the configured cache backend so every worker benefits from one worker's embedding call.
+EMBEDDING_CACHE_SHARED = os.getenv("EMBEDDING_CACHE_SHARED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+_local = LRUCache(
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+    sizeof=lambda vector: vector.nbytes,
+)
+# Shared-tier writes run after the caller has its vector; references keep them from being garbage-collected.
+_shared_writes: set[asyncio.Task] = set()
+
+
+def normalize_query(text: str) -> str:
+    # Case and whitespace differences don't change what a user is asking, so they share an embedding.
+    return " ".join(text.split()).casefold()
+
+
+def _cache_key(normalized: str, model: str) -> str:
+    digest = hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+    return f"query_embedding:{model}:{digest}"
+
+
+def _encode(vector: np.ndarray) -> str:
+    # float32 bytes are ~4x smaller than a JSON list; base64 keeps them safe for the REST backend.
+    return base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+
+
+def _decode(raw: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(raw), dtype="<f4")
+
+
+async def _get_shared(key: str) -> np.ndarray | None:
+    try:
+        raw = await redis_cache.backend.get(key)
+    except Exception:
+        logger.warning("Shared embedding cache read failed", exc_info=True)
+        return None
+    return _decode(raw) if raw else None
+
+
+async def _set_shared(key: str, vector: np.ndarray) -> None:
+    try:
+        await redis_cache.backend.set(key, _encode(vector), ttl=EMBEDDING_CACHE_TTL)
+    except Exception:
+        logger.warning("Shared embedding cache write failed", exc_info=True)
+
+
+async def get_query_embedding(
+    text: str, model: str, embed_query: Callable[[str], Awaitable[list[float]]]
+) -> list[float]:
+    normalized = normalize_query(text)
+    key = _cache_key(normalized, model)
+
+    vector = _local.get(key)
+    if vector is None and EMBEDDING_CACHE_SHARED:
+        vector = await _get_shared(key)
+        if vector is not None:
+            _local.set(key, vector)
+
+    if vector is None:
+        vector = np.asarray(await embed_query(normalized), dtype=np.float32)
+        _local.set(key, vector)
+        if EMBEDDING_CACHE_SHARED:
+            task = asyncio.create_task(_set_shared(key, vector))
+            _shared_writes.add(task)
+            task.add_done_callback(_shared_writes.discard)
+
+    return vector.tolist()
+
+
+def stats() -> dict:
+    return _local.stats()
@@ -0,0 +1,166 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "pinecone" (hosted llama-text-embed-v2) or "local" (deterministic CPU feature-hashing vectorizer).
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "pinecone").lower()
+PINECONE_EMBEDDING_MODEL = "llama-text-embed-v2"
+PINECONE_EMBEDDING_DIMENSION = 1024
+PINECONE_QUERY_PARAMETERS = {"input_type": "query", "truncate": "END"}
+LOCAL_EMBEDDING_DIMENSION = int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "1024"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Batches smaller than this are hashed in a thread; larger ones are split across the process pool.
+LOCAL_EMBEDDING_PROCESS_THRESHOLD = int(os.getenv("LOCAL_EMBEDDING_PROCESS_THRESHOLD", "256"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingProvider:
+    """Turns text into dense vectors. Sync methods block; the async ones keep work off the event loop."""
+
+    name = "base"
+    model = ""
+    dimension = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> list[float]:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+    def info(self) -> dict:
+        return {"embedding_provider": self.name, "embedding_model": self.model, "embedding_dimension": self.dimension}
+
+    def close(self) -> None:
+        return None
+
+
+class PineconeEmbeddingProvider(EmbeddingProvider):
+    name = "pinecone"
+    model = PINECONE_EMBEDDING_MODEL
+    dimension = PINECONE_EMBEDDING_DIMENSION
+
+    def __init__(self, api_key: str | None):
+        if not api_key:
+            raise ValueError("PINECONE_API_KEY environment variable not set")
+        from langchain_pinecone import PineconeEmbeddings
+        from pinecone import Pinecone
+
+        self._client = PineconeEmbeddings(model=self.model, pinecone_api_key=api_key)
+        self._inference = Pinecone(api_key=api_key).inference
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._client.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._client.embed_query(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # One inference request for many queries, keeping the "query" input type that embed_documents would lose.
+        response = self._inference.embed(model=self.model, inputs=texts, parameters=PINECONE_QUERY_PARAMETERS)
+        return [r["values"] for r in response]
+
+
+def _hash_features(text: str) -> list[str]:
+    words = [w.casefold() for w in _WORD_RE.findall(text)]
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        # Character trigrams make near-spellings and inflections land close together.
+        padded = f"<{word}>"
+        features.extend(f"#{padded[i : i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def _hash_embed(texts: list[str], dimension: int) -> np.ndarray:
+    out = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, text in enumerate(texts):
+        features = _hash_features(text)
+        if not features:
+            continue
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        buckets = (hashes % dimension).astype(np.int64)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(out[row], buckets, signs)
+    # Sublinear term frequency, then unit length so dot product equals cosine similarity.
+    np.copyto(out, np.sign(out) * np.log1p(np.abs(out)))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def _hash_embed_lists(texts: list[str], dimension: int) -> list[list[float]]:
+    return _hash_embed(texts, dimension).tolist()
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic signed feature hashing of words, word bigrams and character trigrams.
+
+    Needs no model download or network, and the same text always maps to the same vector in every process.
+    It captures lexical overlap rather than meaning, which suits offline deployments and tests.
+    """
+
+    name = "local"
+
+    def __init__(self, dimension: int = LOCAL_EMBEDDING_DIMENSION, workers: int = EMBEDDING_WORKERS):
+        self.dimension = dimension
+        self.model = f"hashing-v1-{dimension}"
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return _hash_embed_lists(texts, self.dimension)
+
+    def embed_query(self, text: str) -> list[float]:
+        return _hash_embed_lists([text], self.dimension)[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return _hash_embed_lists(texts, self.dimension)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if len(texts) < LOCAL_EMBEDDING_PROCESS_THRESHOLD or self.workers <= 1:
+            return await asyncio.to_thread(self.embed_documents, texts)
+        if self._executor is None:
+            # Spawned rather than forked: a fork would copy locks held by this process's threads into the child.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        size = -(-len(texts) // self.workers)
+        parts = await asyncio.gather(
+            *[
+                loop.run_in_executor(self._executor, _hash_embed_lists, texts[i : i + size], self.dimension)
+                for i in range(0, len(texts), size)
+            ]
+        )
+        return [vector for part in parts for vector in part]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def create_provider(api_key: str | None = None) -> EmbeddingProvider:
+    if EMBEDDING_PROVIDER == "local":
+        return HashingEmbeddingProvider()
+    if EMBEDDING_PROVIDER == "pinecone":
+        return PineconeEmbeddingProvider(api_key)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {EMBEDDING_PROVIDER}")
@@ -1,21 +1,36 @@
+import asyncio
+import codecs
+import multiprocessing
 import os
-from typing import BinaryIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import aclosing
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Callable, Iterator
 
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pypdf import PdfReader
 
+from chunker import Chunk, Chunker, ChunkStream
+
 load_dotenv()
 
 ALLOWED_EXTENSIONS = {".txt", ".pdf"}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+# Uploads are streamed from disk, so this is a sanity limit rather than a memory bound.
+MAX_FILE_SIZE = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+TEXT_READ_BLOCK_SIZE = 256 * 1024
+
+# pypdf is pure Python, so large PDFs are split into page ranges extracted in worker processes.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Below this many pages the cost of reopening the file in each worker outweighs the parallelism.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+_executor: ProcessPoolExecutor | None = None
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200,
-    length_function=len,
-)
+# Size, overlap and unit come from CHUNK_SIZE / CHUNK_OVERLAP / CHUNK_UNIT.
+text_splitter = Chunker()
 
 
 def validate_file(file: BinaryIO, filename: str) -> tuple[bool, str]:
@@ -32,55 +47,151 @@ def validate_file(file: BinaryIO, filename: str) -> tuple[bool, str]:
     return True, ""
 
 
-def extract_text_from_file(file: BinaryIO, filename: str) -> str:
-    ext = os.path.splitext(filename)[1].lower()
+def _extract_page_range(path: str, start: int, stop: int) -> list[str]:
+    # Runs in a worker process: each worker reopens the PDF and extracts only its own pages.
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def _count_pdf_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _iter_pdf_pages(path: str, on_page: Callable[[int], None] | None = None) -> Iterator[str]:
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for page in reader.pages:
+            yield page.extract_text()
+            if on_page:
+                on_page(1)
 
-    if ext == ".txt":
-        return extract_text_from_txt(file)
-    elif ext == ".pdf":
-        return extract_text_from_pdf(file)
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
 
+def iter_text_blocks(file: BinaryIO, block_size: int = TEXT_READ_BLOCK_SIZE) -> Iterator[str]:
+    # Incremental decoding keeps multi-byte characters that straddle two reads intact.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while block := file.read(block_size):
+        if text := decoder.decode(block):
+            yield text
+    if text := decoder.decode(b"", final=True):
+        yield text
 
-def extract_text_from_txt(file: BinaryIO) -> str:
-    content = file.read()
-    return content.decode("utf-8", errors="ignore")
 
+def _iter_text_file(path: str) -> Iterator[str]:
+    with open(path, "rb") as f:
+        yield from iter_text_blocks(f)
 
-def extract_text_from_pdf(file: BinaryIO) -> str:
-    pdf_reader = PdfReader(file)
-    text_parts = []
 
-    for page_num in range(len(pdf_reader.pages)):
-        page = pdf_reader.pages[page_num]
-        text_parts.append(page.extract_text())
+async def _aiter_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    try:
+        while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+            yield item
+    finally:
+        iterator.close()
 
-    return "\n\n".join(text_parts)
 
+async def aiter_pdf_pages(path: str, on_page: Callable[[int], None] | None = None) -> AsyncIterator[str]:
+    """Yields page texts in order. Large PDFs are extracted in page ranges across the process pool, with only a
+    bounded number of ranges in flight so memory doesn't grow with the page count."""
+    global _executor
 
-def process_file(file: BinaryIO, filename: str) -> list[Document]:
-    is_valid, error = validate_file(file, filename)
+    page_count = await asyncio.to_thread(_count_pdf_pages, path)
+    if PDF_EXTRACT_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        async for text in _aiter_in_thread(_iter_pdf_pages(path, on_page)):
+            yield text
+        return
+
+    if _executor is None:
+        # Forking a process that runs an event loop and worker threads can copy held locks; start clean instead.
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    loop = asyncio.get_running_loop()
+    size = max(1, min(PDF_PAGES_PER_TASK, -(-page_count // PDF_EXTRACT_WORKERS)))
+    starts = iter(range(0, page_count, size))
+    pending: deque[asyncio.Future] = deque()
+
+    def submit(count: int) -> None:
+        for start in islice(starts, count):
+            stop = min(start + size, page_count)
+            pending.append(loop.run_in_executor(_executor, _extract_page_range, path, start, stop))
+
+    submit(2 * PDF_EXTRACT_WORKERS)
+    try:
+        while pending:
+            pages = await pending.popleft()
+            submit(1)
+            if on_page:
+                on_page(len(pages))
+            for text in pages:
+                yield text
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def close() -> None:
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def aiter_documents(
+    path: str, filename: str, on_page: Callable[[int], None] | None = None, source: str | None = None
+) -> AsyncIterator[Document]:
+    """Streams chunk Documents from a file on disk as they are extracted, keeping memory bounded by file size.
+
+    Decoding, extraction and splitting run off the event loop. Documents carry ``chunk_index``, character
+    offsets into the extracted text and, for PDFs, the pages they span, but not ``total_chunks``, which isn't
+    known until the file has been read to the end. ``source`` (default: ``filename``) is recorded in metadata.
+    """
+    with open(path, "rb") as f:
+        is_valid, error = validate_file(f, filename)
     if not is_valid:
         raise ValueError(error)
 
-    text = extract_text_from_file(file, filename)
-
-    if not text.strip():
+    if os.path.splitext(filename)[1].lower() == ".pdf":
+        texts = _numbered_pages(aiter_pdf_pages(path, on_page=on_page))
+    else:
+        texts = _unpaged(_aiter_in_thread(_iter_text_file(path)))
+
+    source = source or filename
+    stream = ChunkStream(text_splitter)
+    chunk_index = 0
+    async with aclosing(texts):
+        async for text, page in texts:
+            for chunk, page_start, page_end in await asyncio.to_thread(stream.feed, text, page):
+                yield _chunk_document(chunk, source, chunk_index, page_start, page_end)
+                chunk_index += 1
+    for chunk, page_start, page_end in await asyncio.to_thread(stream.finish):
+        yield _chunk_document(chunk, source, chunk_index, page_start, page_end)
+        chunk_index += 1
+
+    if chunk_index == 0:
         raise ValueError("No text content found in file")
 
-    chunks = text_splitter.split_text(text)
-
-    documents = []
-    for i, chunk in enumerate(chunks):
-        doc = Document(
-            page_content=chunk,
-            metadata={
-                "source": filename,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-            },
-        )
-        documents.append(doc)
 
-    return documents
+async def _numbered_pages(pages: AsyncIterator[str]) -> AsyncIterator[tuple[str, int]]:
+    # Pages are joined with a paragraph break, so offsets index the text of the whole document.
+    page_number = 0
+    async with aclosing(pages):
+        async for text in pages:
+            page_number += 1
+            yield (text if page_number == 1 else "\n\n" + text), page_number
+
+
+async def _unpaged(texts: AsyncIterator[str]) -> AsyncIterator[tuple[str, None]]:
+    async with aclosing(texts):
+        async for text in texts:
+            yield text, None
+
+
+def _chunk_document(
+    chunk: Chunk, filename: str, chunk_index: int, page_start: int | None = None, page_end: int | None = None
+) -> Document:
+    metadata = {"source": filename, "chunk_index": chunk_index, "start_offset": chunk.start, "end_offset": chunk.end}
+    if page_start is not None:
+        metadata["page_start"] = page_start
+        metadata["page_end"] = page_end
+    return Document(page_content=chunk.text, metadata=metadata)
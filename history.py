@@ -0,0 +1,80 @@
+import os
+
+from dotenv import load_dotenv
+
+import llm
+import tokens
+
+load_dotenv()
+
+# Default number of (estimated) tokens of past messages sent with each turn; agents override it with
+# history_token_budget on their record.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+# Chat formatting adds a few tokens per message on top of its content.
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def count_tokens(text: str | None) -> int:
+    return tokens.estimate_tokens(text) if text else 0
+
+
+def message_tokens(message: dict) -> int:
+    """Token count of a stored message, read from its metadata or counted once and kept on the message dict.
+
+    Counts are written into metadata when a message is stored; older messages are counted on first use, and
+    since the recent-message caches hand out the same dicts the count is not recomputed on later turns.
+    """
+    metadata = message.get("metadata")
+    if metadata is None:
+        metadata = message["metadata"] = {}
+    count = metadata.get("tokens")
+    if count is None:
+        count = metadata["tokens"] = count_tokens(message.get("content"))
+    return count
+
+
+def available_tokens(agent: dict | None, reserved_tokens: int) -> int:
+    """History budget for a turn: the agent's budget, capped so that the reserved part of the prompt (system
+    prompt, RAG context and the new message) plus the reply still fit in the model window."""
+    budget = (agent or {}).get("history_token_budget")
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    window = llm.LLM_CONTEXT_WINDOW - llm.MAX_TOKENS - reserved_tokens - MESSAGE_TOKEN_OVERHEAD
+    return max(min(budget, window), 0)
+
+
+def fit_history(messages: list[dict], budget: int) -> tuple[list[dict], int]:
+    """Newest-first selection of user/assistant messages within ``budget`` tokens, returned oldest first.
+
+    Selection stops at the first message that doesn't fit, so the history is always a contiguous tail of the
+    conversation. Returns the LLM-formatted messages and the tokens they use.
+    """
+    selected = []
+    used = 0
+    for message in reversed(messages):
+        if message.get("role") not in ("user", "assistant") or not message.get("content"):
+            continue
+        cost = message_tokens(message) + MESSAGE_TOKEN_OVERHEAD
+        if used + cost > budget:
+            break
+        selected.append({"role": message["role"], "content": message["content"]})
+        used += cost
+    selected.reverse()
+    return selected, used
+
+
+def after_summary(messages: list[dict], summary: dict | None) -> list[dict]:
+    """Drop messages already folded into the conversation summary (see summaries.py)."""
+    if not summary:
+        return messages
+    for i, message in enumerate(messages):
+        if message.get("id") == summary.get("last_message_id"):
+            return messages[i + 1 :]
+    # The summarized point is older than the loaded window.
+    return messages
+
+
+def with_summary(system_prompt: str | None, summary: dict | None) -> str | None:
+    if not summary or not summary.get("text"):
+        return system_prompt
+    section = f"Summary of the earlier conversation:\n{summary['text']}"
+    return f"{system_prompt}\n\n{section}" if system_prompt else section
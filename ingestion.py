@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Provider limits: Pinecone inference takes at most 96 inputs per embed call, and upserts should stay
+# under ~100 vectors / 2MB per request.
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "96"))
+INGEST_EMBED_BATCH_CHARS = int(os.getenv("INGEST_EMBED_BATCH_CHARS", "200000"))
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+INGEST_UPSERT_BATCH_BYTES = int(os.getenv("INGEST_UPSERT_BATCH_BYTES", str(2 * 1024 * 1024)))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "0.5"))
+
+EmbedFn = Callable[[list[str]], Awaitable[list[list[float]]]]
+UpsertFn = Callable[[list[dict]], Awaitable[Any]]
+ProgressFn = Callable[[str, int], Awaitable[None]]
+ExistingFn = Callable[[list[str]], Awaitable[set[str]]]
+RegisterFn = Callable[[list[dict]], Awaitable[Any]]
+SaveChunksFn = Callable[[list[dict]], Awaitable[Any]]
+
+
+def chunk_id(text: str, model: str) -> str:
+    # Content-addressed: the same text embedded by the same model always gets the same vector id, so a
+    # re-uploaded chunk can be recognised and skipped. Whitespace is normalized; case is meaningful.
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+def batch_by_limits(items: Iterable, max_items: int, max_bytes: int, size_of: Callable[[Any], int]) -> Iterator[list]:
+    # Greedy packing; an item larger than max_bytes still goes out alone rather than being dropped.
+    batch, batch_bytes = [], 0
+    for item in items:
+        size = size_of(item)
+        if batch and (len(batch) >= max_items or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+async def abatch_by_limits(
+    items: AsyncIterable, max_items: int, max_bytes: int, size_of: Callable[[Any], int]
+) -> AsyncIterator[list]:
+    batch, batch_bytes = [], 0
+    async for item in items:
+        size = size_of(item)
+        if batch and (len(batch) >= max_items or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+async def aiter_items(items: Iterable | AsyncIterable) -> AsyncIterator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _vector_bytes(vector: dict) -> int:
+    # Approximate request size: floats serialize to roughly 10 bytes each plus ids and metadata.
+    return len(vector["id"]) + 10 * len(vector["values"]) + len(json.dumps(vector.get("metadata") or {}, default=str))
+
+
+async def _with_retries(what: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, int]:
+    for attempt in range(1, INGEST_MAX_ATTEMPTS + 1):
+        try:
+            return await fn(), attempt
+        except Exception:
+            if attempt == INGEST_MAX_ATTEMPTS:
+                raise
+            logger.warning("%s failed (attempt %d/%d); retrying", what, attempt, INGEST_MAX_ATTEMPTS, exc_info=True)
+            await asyncio.sleep(INGEST_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+async def run_pipeline(
+    documents: Iterable[dict] | AsyncIterable[dict],
+    embed: EmbedFn,
+    upsert: UpsertFn,
+    on_progress: ProgressFn | None = None,
+    concurrency: int = INGEST_CONCURRENCY,
+    existing: ExistingFn | None = None,
+    register: RegisterFn | None = None,
+    save_chunks: SaveChunksFn | None = None,
+) -> dict:
+    """Embed and upsert ``documents`` ({"id", "text", "metadata"}) in size-bounded batches.
+
+    ``documents`` may be a (lazy) iterable or an async iterable; it is consumed as batches are needed, and at
+    most ``concurrency`` embedding batches are in flight, so a large file never has to be held in memory.
+    Each embedded batch is split into upsert requests capped by vector count and request bytes, and failed
+    batches are retried with exponential backoff. Returns aggregate batch timings.
+
+    With ``existing``, each batch's ids are looked up in one call first and chunks already in the index are
+    not embedded again. ``register`` is called with every batch (new and skipped chunks) once it is stored.
+
+    Vector metadata carries only the document metadata. Without ``save_chunks`` the chunk text is added to it
+    under "text"; with it, the text of each embedded batch is saved there before its vectors are upserted.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    embed_stats = _new_stats()
+    upsert_stats = _new_stats()
+    skipped = 0
+
+    async def process(batch_number: int, batch: list[dict]) -> None:
+        nonlocal skipped
+
+        # Repeated chunks within a batch are embedded once.
+        fresh = list({doc["id"]: doc for doc in batch}.values())
+        if existing is not None:
+            known, _ = await _with_retries(
+                f"Chunk lookup for batch {batch_number}", lambda: existing([doc["id"] for doc in fresh])
+            )
+            fresh = [doc for doc in fresh if doc["id"] not in known]
+        if len(fresh) < len(batch):
+            skipped += len(batch) - len(fresh)
+            if on_progress:
+                await on_progress("chunks_skipped", len(batch) - len(fresh))
+        if fresh:
+            await embed_and_upsert(batch_number, fresh)
+        if register is not None:
+            await _with_retries(f"Chunk registration for batch {batch_number}", lambda: register(batch))
+
+    async def embed_and_upsert(batch_number: int, batch: list[dict]) -> None:
+        t0 = time.perf_counter()
+        texts = [doc["text"] for doc in batch]
+        values, attempts = await _with_retries(f"Embedding batch {batch_number}", lambda: embed(texts))
+        _record(embed_stats, len(batch), attempts, t0)
+        if on_progress:
+            await on_progress("chunks_embedded", len(batch))
+
+        if save_chunks is not None:
+            await _with_retries(f"Saving chunk text for batch {batch_number}", lambda: save_chunks(batch))
+            vectors = [
+                {"id": doc["id"], "values": vector, "metadata": doc.get("metadata", {})}
+                for doc, vector in zip(batch, values)
+            ]
+        else:
+            vectors = [
+                {"id": doc["id"], "values": vector, "metadata": {**doc.get("metadata", {}), "text": doc["text"]}}
+                for doc, vector in zip(batch, values)
+            ]
+        for upsert_batch in batch_by_limits(
+            vectors, INGEST_UPSERT_BATCH_SIZE, INGEST_UPSERT_BATCH_BYTES, _vector_bytes
+        ):
+            t1 = time.perf_counter()
+            _, attempts = await _with_retries(f"Upsert of {len(upsert_batch)} vectors", lambda: upsert(upsert_batch))
+            _record(upsert_stats, len(upsert_batch), attempts, t1)
+            if on_progress:
+                await on_progress("vectors_upserted", len(upsert_batch))
+
+    in_flight: set[asyncio.Task] = set()
+    failures: list[BaseException] = []
+
+    def finished(task: asyncio.Task) -> None:
+        in_flight.discard(task)
+        semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+
+    chunks = batches = 0
+    embed_batches = abatch_by_limits(
+        aiter_items(documents), INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_BATCH_CHARS, lambda doc: len(doc["text"])
+    )
+    try:
+        async with aclosing(embed_batches):
+            async for batch in embed_batches:
+                # Waiting for a free slot before reading on is what bounds memory.
+                await semaphore.acquire()
+                if failures:
+                    semaphore.release()
+                    break
+                task = asyncio.ensure_future(process(batches, batch))
+                in_flight.add(task)
+                task.add_done_callback(finished)
+                batches += 1
+                chunks += len(batch)
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    except BaseException:
+        for task in list(in_flight):
+            task.cancel()
+        raise
+    if failures:
+        raise failures[0]
+
+    return {
+        "chunks": chunks,
+        "skipped": skipped,
+        "embed_batches": _summarize(embed_stats),
+        "upsert_batches": _summarize(upsert_stats),
+        "total_ms": _ms_since(started),
+    }
+
+
+def _new_stats() -> dict:
+    return {"count": 0, "items": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+def _record(stats: dict, size: int, attempts: int, started: float) -> None:
+    ms = _ms_since(started)
+    stats["count"] += 1
+    stats["items"] += size
+    stats["retries"] += attempts - 1
+    stats["total_ms"] += ms
+    stats["max_ms"] = max(stats["max_ms"], ms)
+
+
+def _summarize(stats: dict) -> dict:
+    count = stats["count"] or 1
+    return {
+        "count": stats["count"],
+        "avg_size": round(stats["items"] / count, 1),
+        "retries": stats["retries"],
+        "avg_ms": round(stats["total_ms"] / count, 1),
+        "max_ms": stats["max_ms"],
+    }
+
+
+def _ms_since(start: float) -> float:
+    return round(1000 * (time.perf_counter() - start), 1)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+import file_processor
+import pinecone_service
+import repositories
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Uploads wait here until a worker picks them up; dedicated workers need this directory shared with the API.
+INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "data/uploads")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Set to false when ingestion runs only in separate `python worker.py` processes.
+INGEST_IN_PROCESS_WORKERS = os.getenv("INGEST_IN_PROCESS_WORKERS", "true").lower() in ("1", "true", "yes")
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+INGEST_PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "1"))
+# Chunk ids are kept in the job result only for files up to this many chunks, to bound the record size.
+INGEST_JOB_MAX_IDS = int(os.getenv("INGEST_JOB_MAX_IDS", "10000"))
+# A running job whose record hasn't been touched for this long is assumed orphaned by a dead worker.
+INGEST_JOB_STALE_SECONDS = int(os.getenv("INGEST_JOB_STALE_SECONDS", "600"))
+
+_wakeup = asyncio.Event()
+_workers: list[asyncio.Task] = []
+
+
+class JobProgress:
+    """Progress counters for one running job, written to its record periodically instead of per increment."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.counts = {
+            "pages_parsed": 0,
+            "chunks": 0,
+            "chunks_skipped": 0,
+            "chunks_embedded": 0,
+            "vectors_upserted": 0,
+        }
+
+    def add(self, field: str, n: int) -> None:
+        self.counts[field] += n
+
+    async def report(self, field: str, n: int) -> None:
+        self.add(field, n)
+
+    async def flush(self) -> None:
+        await repositories.update_ingestion_job(self.job_id, {"progress": dict(self.counts)})
+
+    async def run(self) -> None:
+        # Also serves as the job's heartbeat for stale-job recovery.
+        while True:
+            await asyncio.sleep(INGEST_PROGRESS_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Failed to record progress for ingestion job %s", self.job_id, exc_info=True)
+
+
+def _save_upload(file: BinaryIO, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out, 1024 * 1024)
+
+
+async def enqueue_upload(
+    file: BinaryIO,
+    filename: str,
+    namespace: str = "",
+    source: str | None = None,
+    replace: bool = False,
+    agent_scopes: list[str] | None = None,
+) -> dict:
+    """Store an upload and queue its ingestion. With ``replace``, the stored chunks of ``source`` are synced
+    to this file: unchanged chunks are kept, new ones added and ones no longer present deleted.
+    ``agent_scopes`` tags every chunk so agents configured with those scopes can filter on them."""
+    ext = os.path.splitext(filename)[1].lower()
+    path = os.path.join(INGEST_UPLOAD_DIR, f"{uuid4().hex}{ext}")
+    await asyncio.to_thread(_save_upload, file, path)
+    payload = {
+        "filename": filename,
+        "source": source or filename,
+        "mode": "replace" if replace else "add",
+        "path": path,
+        "namespace": namespace,
+        "agent_scopes": sorted(set(agent_scopes)) if agent_scopes else None,
+    }
+    try:
+        job = await repositories.create_ingestion_job(payload)
+    except Exception:
+        os.remove(path)
+        raise
+    _wakeup.set()
+    return job
+
+
+async def _stream_documents(job: dict, progress: JobProgress, ids: list[str]) -> AsyncIterator[dict]:
+    documents = file_processor.aiter_documents(
+        job["path"], job["filename"], on_page=lambda n: progress.add("pages_parsed", n), source=job.get("source")
+    )
+    scopes = job.get("agent_scopes")
+    async with aclosing(documents):
+        async for doc in documents:
+            doc_id = pinecone_service.chunk_id(doc.page_content, scopes)
+            if scopes:
+                doc.metadata["agent_scopes"] = scopes
+            # Lets retrieval tell which chunks share offsets: chunks kept from an older version keep theirs.
+            doc.metadata["ingest_id"] = job["id"]
+            if len(ids) < INGEST_JOB_MAX_IDS:
+                ids.append(doc_id)
+            progress.add("chunks", 1)
+            yield {"id": doc_id, "text": doc.page_content, "metadata": doc.metadata}
+
+
+async def run_job(job: dict) -> None:
+    progress = JobProgress(job["id"])
+    ticker = asyncio.create_task(progress.run())
+    ids: list[str] = []
+    try:
+        documents = _stream_documents(job, progress, ids)
+        namespace = job.get("namespace", "")
+        if job.get("mode") == "replace":
+            report = await pinecone_service.replace_source(
+                documents, job["source"], namespace=namespace, on_progress=progress.report
+            )
+        else:
+            report = await pinecone_service.add_documents(documents, namespace=namespace, on_progress=progress.report)
+    except Exception as e:
+        logger.exception("Ingestion job %s (%s) failed", job["id"], job["filename"])
+        fields = {"status": "failed", "error": str(e)}
+    else:
+        chunks = report["chunks"]
+        fields = {
+            "status": "succeeded",
+            "result": {"chunks": chunks, "ids": ids if chunks <= INGEST_JOB_MAX_IDS else None, "ingestion": report},
+        }
+    finally:
+        ticker.cancel()
+
+    fields.update(progress=progress.counts, finished_at=datetime.now(timezone.utc))
+    await repositories.update_ingestion_job(job["id"], fields)
+    try:
+        os.remove(job["path"])
+    except FileNotFoundError:
+        pass
+
+
+async def _worker_loop(worker_id: str) -> None:
+    while True:
+        # Cleared before claiming so an enqueue that lands after an empty claim still wakes us.
+        _wakeup.clear()
+        try:
+            job = await repositories.claim_ingestion_job(worker_id, INGEST_JOB_STALE_SECONDS)
+        except Exception:
+            logger.warning("Failed to claim ingestion job", exc_info=True)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), INGEST_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        if job.get("attempts", 1) > 1:
+            logger.info("Resuming ingestion job %s abandoned by a stopped worker", job["id"])
+        try:
+            await run_job(job)
+        except Exception:
+            logger.exception("Ingestion worker %s failed to finish job %s", worker_id, job["id"])
+
+
+async def start_workers(count: int = INGEST_WORKERS) -> None:
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(count):
+        _workers.append(asyncio.create_task(_worker_loop(f"{prefix}:{i}")))
+
+
+async def stop_workers() -> None:
+    # Interrupted jobs stay "running" with their upload on disk and are claimed again once stale.
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
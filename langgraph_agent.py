@@ -1,15 +1,20 @@
+import time
 from typing import AsyncGenerator, List, Optional, TypedDict
 
 from langgraph.graph import END, StateGraph
 
 import llm
 import rag
+import retrieval_router
 
 
 class AgentState(TypedDict):
     prompt: str
+    agent: Optional[dict]
     system_prompt: Optional[str]
     history: Optional[List[dict]]
+    retrieval: Optional[tuple]
+    route: Optional[dict]
     context: Optional[str]
     response: Optional[str]
     rag_used: Optional[bool]
@@ -20,19 +25,80 @@ class RagResponse(TypedDict):
     content: str
     rag_used: bool
     rag_docs_count: int
+    route: Optional[dict]
+
+
+async def retrieve(prompt: str, agent: dict | None = None) -> tuple[str, list[rag.Document]]:
+    # Each agent searches its own namespace / scope as configured on its record.
+    return await rag.build_rag_prompt(prompt, **rag.retrieval_options(agent))
+
+
+def _route(prompt: str, agent: dict | None) -> dict:
+    # Routing record stored in message metadata: the decision, its reason, and later the time spent or saved.
+    decision = retrieval_router.route(prompt, agent)
+    route = {"retrieve": decision.retrieve, "reason": decision.reason}
+    if decision.score is not None:
+        route["score"] = decision.score
+    if not decision.retrieve:
+        route["saved_ms"] = retrieval_router.record_skip(decision)
+    return route
+
+
+async def _timed_retrieve(prompt: str, agent: dict | None, route: dict) -> tuple[str, list[rag.Document]]:
+    started = time.perf_counter()
+    retrieval = await retrieve(prompt, agent)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    retrieval_router.record_retrieval(elapsed_ms)
+    route["retrieval_ms"] = round(elapsed_ms, 1)
+    return retrieval
+
+
+async def routed_retrieve(prompt: str, agent: dict | None = None) -> tuple[tuple[str, list[rag.Document]], dict]:
+    """Retrieve only when the router says the turn needs it; returns the retrieval and the routing record."""
+    route = _route(prompt, agent)
+    if not route["retrieve"]:
+        return ("", []), route
+    return await _timed_retrieve(prompt, agent, route), route
+
+
+def _summarize_retrieval(retrieval: tuple[str, list[rag.Document]]) -> tuple[str, bool, int]:
+    context_str, context_docs = retrieval
+    rag_used = len(context_docs) > 0 if context_docs else False
+    rag_docs_count = len(context_docs) if context_docs else 0
+    return context_str, rag_used, rag_docs_count
+
+
+def _build_full_prompt(prompt: str, context_str: str | None) -> str:
+    if context_str:
+        return f"{context_str}\n\nAnswer the user's question above based on the context provided."
+    return prompt
 
 
 def _build_graph() -> StateGraph:
     graph = StateGraph(AgentState)
 
-    async def retrieve(state: AgentState) -> AgentState:
-        prompt = state["prompt"]
-        context_str, context_docs = rag.build_rag_prompt(prompt, include_context=True)
-        rag_used = len(context_docs) > 0 if context_docs else False
+    async def route_node(state: AgentState) -> AgentState:
+        # Retrieval passed in by the caller was already routed.
+        if state.get("retrieval") is not None:
+            return {}
+        return {"route": _route(state["prompt"], state.get("agent"))}
+
+    def after_route(state: AgentState) -> str:
+        route = state.get("route")
+        return "respond" if route is not None and not route["retrieve"] else "retrieve"
+
+    async def retrieve_node(state: AgentState) -> AgentState:
+        retrieval = state.get("retrieval")
+        route = state.get("route")
+        if retrieval is None:
+            route = dict(route or {})
+            retrieval = await _timed_retrieve(state["prompt"], state.get("agent"), route)
+        context_str, rag_used, rag_docs_count = _summarize_retrieval(retrieval)
         return {
             "context": context_str,
             "rag_used": rag_used,
-            "rag_docs_count": len(context_docs) if context_docs else 0,
+            "rag_docs_count": rag_docs_count,
+            "route": route,
         }
 
     async def respond(state: AgentState) -> AgentState:
@@ -43,21 +109,20 @@ def _build_graph() -> StateGraph:
         rag_used = state.get("rag_used", False)
         rag_docs_count = state.get("rag_docs_count", 0)
 
-        if context:
-            full_prompt = f"{context}\n\nAnswer the user's question above based on the context provided."
-        else:
-            full_prompt = prompt
+        full_prompt = _build_full_prompt(prompt, context)
 
-        response = llm.get_response_text(full_prompt, system_prompt=system_prompt, history=history)
+        response = await llm.get_response_text(full_prompt, system_prompt=system_prompt, history=history)
         return {
             "response": response,
             "rag_used": rag_used,
             "rag_docs_count": rag_docs_count,
         }
 
-    graph.add_node("retrieve", retrieve)
+    graph.add_node("route", route_node)
+    graph.add_node("retrieve", retrieve_node)
     graph.add_node("respond", respond)
-    graph.set_entry_point("retrieve")
+    graph.set_entry_point("route")
+    graph.add_conditional_edges("route", after_route, {"retrieve": "retrieve", "respond": "respond"})
     graph.add_edge("retrieve", "respond")
     graph.add_edge("respond", END)
     return graph
@@ -66,42 +131,50 @@ def _build_graph() -> StateGraph:
 _GRAPH = _build_graph().compile()
 
 
-async def invoke_agent(prompt: str, system_prompt: str | None = None, history: list[dict] | None = None) -> RagResponse:
-    output = await _GRAPH.ainvoke({"prompt": prompt, "system_prompt": system_prompt, "history": history})
+async def invoke_agent(
+    prompt: str,
+    system_prompt: str | None = None,
+    history: list[dict] | None = None,
+    retrieval: tuple[str, list[rag.Document]] | None = None,
+    agent: dict | None = None,
+) -> RagResponse:
+    output = await _GRAPH.ainvoke(
+        {
+            "prompt": prompt,
+            "agent": agent,
+            "system_prompt": system_prompt,
+            "history": history,
+            "retrieval": retrieval,
+        }
+    )
     return {
         "content": output["response"],
         "rag_used": output.get("rag_used", False),
         "rag_docs_count": output.get("rag_docs_count", 0),
+        "route": output.get("route"),
     }
 
 
 async def stream_agent(
-    prompt: str, system_prompt: str | None = None, history: list[dict] | None = None
+    prompt: str,
+    system_prompt: str | None = None,
+    history: list[dict] | None = None,
+    retrieval: tuple[str, list[rag.Document]] | None = None,
+    agent: dict | None = None,
 ) -> tuple[AsyncGenerator[str, None], bool, int]:
-    context_str, context_docs = rag.build_rag_prompt(prompt, include_context=True)
-    rag_used = len(context_docs) > 0 if context_docs else False
-    rag_docs_count = len(context_docs) if context_docs else 0
-
-    if context_str:
-        full_prompt = f"{context_str}\n\nAnswer the user's question above based on the context provided."
-    else:
-        full_prompt = prompt
+    # Callers that already started retrieval concurrently pass its result in to skip a second lookup.
+    if retrieval is None:
+        retrieval = await retrieve(prompt, agent)
+    context_str, rag_used, rag_docs_count = _summarize_retrieval(retrieval)
 
-    async def content_stream():
-        for chunk in llm.stream_response(full_prompt, system_prompt=system_prompt, history=history):
-            yield chunk
-
-    return content_stream(), rag_used, rag_docs_count
+    full_prompt = _build_full_prompt(prompt, context_str)
+    return llm.stream_response(full_prompt, system_prompt=system_prompt, history=history), rag_used, rag_docs_count
 
 
 async def invoke_oracle_agent(prompt: str, system_prompt: str | None = None, history: list[dict] | None = None) -> dict:
     # First, run the exact same retrieval phase
-    context_str, context_docs = rag.build_rag_prompt(prompt, include_context=True)
-    
-    if context_str:
-        full_prompt = f"{context_str}\n\nAnswer the user's question above based on the context provided."
-    else:
-        full_prompt = prompt
-        
-    response = llm.get_oracle_response_structured(full_prompt, system_prompt=system_prompt, history=history)
+    context_str, _ = await retrieve(prompt)
+    full_prompt = _build_full_prompt(prompt, context_str)
+
+    response = await llm.get_oracle_response_structured(full_prompt, system_prompt=system_prompt, history=history)
     return response
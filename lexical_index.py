@@ -0,0 +1,389 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+
+from vector_index import WriterLock, lock_for_write, matches_filter
+
+load_dotenv()
+
+# In-process BM25 index over chunk text, kept next to the vector store and updated on ingest and delete.
+LEXICAL_INDEX = os.getenv("LEXICAL_INDEX", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "data/lexical_index")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Postings added since the last merge are folded into the arrays once this many accumulate.
+_PENDING_LIMIT = 2_000_000
+# Deleted rows are purged from the postings when they make up this share of the index.
+_COMPACT_RATIO = 0.25
+_MAX_TF = np.iinfo(np.uint16).max
+
+_POSTINGS_FILE = "postings.npz"
+_META_FILE = "meta.json"
+
+# Compound tokens keep part numbers, policy codes and versions ("AB-1234", "HR/7.2") whole; their parts are
+# indexed as well so "1234" alone still matches.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:#][a-z0-9]+)*")
+_SPLIT = re.compile(r"[-_./:#]")
+_CODE_JOINER = re.compile(r"[-_/#]")
+_HAS_LETTER = re.compile(r"[a-z]")
+_HAS_DIGIT = re.compile(r"[0-9]")
+_STOPWORDS = frozenset(
+    """a an and are as at be but by for from has have i if in into is it its of on or that the their then there
+    these this to was were what when where which who will with""".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+    for token in [token for token in tokens if not token.isalnum()]:
+        tokens.extend(part for part in _SPLIT.split(token) if part not in _STOPWORDS)
+    return tokens
+
+
+def identifier_terms(query: str) -> list[str]:
+    """Tokens of ``query`` shaped like exact codes: letters and digits joined by - _ / # ("AB-1234", "hr/7.2"), or
+    run together ("AB1234") when such tokens make up most of the query. Years and "401k" in a question don't count.
+    """
+    tokens = [token for token in _TOKEN.findall(query.lower()) if token not in _STOPWORDS]
+    coded = [token for token in tokens if _HAS_LETTER.search(token) and _HAS_DIGIT.search(token)]
+    if 2 * len(coded) < len(tokens):
+        coded = [token for token in coded if _CODE_JOINER.search(token)]
+    return list(dict.fromkeys(coded))
+
+
+class LexicalIndex:
+    """BM25 index with postings in compact NumPy arrays.
+
+    Postings are stored CSR-style: the rows containing term ``t`` are ``_post_rows[_offsets[t]:_offsets[t + 1]]``
+    (int32) with their term frequencies in ``_post_tfs`` (uint16). Added documents append flat (term, row, tf)
+    triples that are folded into the arrays in one vectorized pass on ``save`` or the next search; deletes clear
+    the row's live flag, and dead rows are purged once they reach ``_COMPACT_RATIO`` of the index. Like
+    LocalVectorIndex, writers in several processes are serialized by a WriterLock and readers pick up their saves
+    through ``refresh``.
+    """
+
+    def __init__(self, path: str | None = None, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._terms: dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_rows = np.empty(0, dtype=np.int32)
+        self._post_tfs = np.empty(0, dtype=np.uint16)
+        self._pending_terms: list[int] = []
+        self._pending_rows: list[int] = []
+        self._pending_tfs: list[int] = []
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._metadata: list[dict] = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._total_length = 0
+        self._loaded_mtime: float | None = None
+        self._lock = threading.RLock()
+        self._writer = WriterLock(path) if path else None
+        self._dirty = False
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # -- mutation -------------------------------------------------------------------------------------------
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict] | None = None, save: bool = True) -> None:
+        # Ids are content hashes, so an id that is already indexed holds the same text.
+        lock_for_write(self._lock, self._writer, self.refresh)
+        try:
+            terms = self._terms
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._rows:
+                    continue
+                counts = Counter(tokenize(texts[i]))
+                row = len(self._ids)
+                self._reserve(row + 1)
+                self._ids.append(doc_id)
+                self._rows[doc_id] = row
+                self._metadata.append(dict(metadatas[i]) if metadatas else {})
+                length = sum(counts.values())
+                self._lengths[row] = length
+                self._alive[row] = True
+                self._total_length += length
+                for term in counts:
+                    if term not in terms:
+                        terms[term] = len(terms)
+                self._pending_terms.extend([terms[term] for term in counts])
+                self._pending_rows.extend([row] * len(counts))
+                self._pending_tfs.extend(counts.values())
+                self._dirty = True
+            if len(self._pending_terms) > _PENDING_LIMIT:
+                self._merge()
+            if save:
+                self.save()
+        finally:
+            self._lock.release()
+
+    def delete(self, ids: list[str], save: bool = True) -> None:
+        lock_for_write(self._lock, self._writer, self.refresh)
+        try:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._dirty = True
+            if save:
+                self.save()
+        finally:
+            self._lock.release()
+
+    # -- search ---------------------------------------------------------------------------------------------
+
+    def search(
+        self, query: str, top_k: int = 4, filter: dict | None = None, required_terms: list[str] | None = None
+    ) -> list[tuple[str, float, dict]]:
+        """BM25 top ``top_k``; with ``required_terms`` only documents containing all of them are returned."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or top_k <= 0 or not terms:
+                return []
+            if self._pending_terms:
+                self._merge()
+            avgdl = self._total_length / n or 1.0
+            allowed = self._rows_with_all(required_terms) if required_terms else None
+            if allowed is not None and allowed.size == 0:
+                return []
+            rows_parts, score_parts = [], []
+            for term in terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                rows, tfs = self._postings(term_id)
+                if rows.size == 0:
+                    continue
+                idf = math.log(1 + (n - rows.size + 0.5) / (rows.size + 0.5))
+                if allowed is not None:
+                    # Score only the few rows holding the required identifiers; posting lists are sorted.
+                    positions = np.minimum(np.searchsorted(rows, allowed), rows.size - 1)
+                    hit = rows[positions] == allowed
+                    rows, tfs = allowed[hit], tfs[positions[hit]]
+                tf = tfs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[rows] / avgdl)
+                rows_parts.append(rows)
+                score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+            if not rows_parts:
+                return []
+
+            candidates, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            keep = self._alive[candidates]
+            if filter:
+                keep &= np.fromiter(
+                    (matches_filter(self._metadata[row], filter) for row in candidates.tolist()),
+                    dtype=bool,
+                    count=candidates.size,
+                )
+            candidates, scores = candidates[keep], scores[keep]
+            if candidates.size == 0:
+                return []
+
+            k = min(top_k, candidates.size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [
+                (self._ids[row], float(scores[i]), self._metadata[row])
+                for i, row in zip(best.tolist(), candidates[best].tolist())
+            ]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._rows),
+            "terms": len(self._terms),
+            "postings": int(self._post_rows.size) + len(self._pending_terms),
+            "deleted_rows": len(self._ids) - len(self._rows),
+        }
+
+    # -- postings -------------------------------------------------------------------------------------------
+
+    def _rows_with_all(self, terms: list[str]) -> np.ndarray:
+        allowed = None
+        for term in terms:
+            term_id = self._terms.get(term)
+            if term_id is None:
+                return np.empty(0, dtype=np.int32)
+            rows = self._postings(term_id)[0]
+            allowed = rows if allowed is None else np.intersect1d(allowed, rows, assume_unique=True)
+        return allowed
+
+    def _postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        return self._post_rows[start:end], self._post_tfs[start:end]
+
+    def _merge(self, compact: bool = False) -> None:
+        # Fold pending postings into the CSR arrays; with ``compact``, also drop deleted rows and renumber.
+        base_terms = np.repeat(np.arange(self._offsets.size - 1, dtype=np.int64), np.diff(self._offsets))
+        terms = np.concatenate((base_terms, np.asarray(self._pending_terms, dtype=np.int64)))
+        rows = np.concatenate((self._post_rows, np.asarray(self._pending_rows, dtype=np.int32)))
+        pending_tfs = np.minimum(np.asarray(self._pending_tfs, dtype=np.int64), _MAX_TF).astype(np.uint16)
+        tfs = np.concatenate((self._post_tfs, pending_tfs))
+
+        if compact:
+            size = len(self._ids)
+            alive = self._alive[:size]
+            live = alive[rows]
+            terms, rows, tfs = terms[live], rows[live], tfs[live]
+            renumber = np.cumsum(alive, dtype=np.int64) - 1
+            rows = renumber[rows].astype(np.int32)
+            kept = np.flatnonzero(alive).tolist()
+            self._ids = [self._ids[row] for row in kept]
+            self._metadata = [self._metadata[row] for row in kept]
+            self._lengths = self._lengths[:size][alive].copy()
+            self._alive = np.ones(len(kept), dtype=bool)
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._total_length = int(self._lengths.sum())
+
+        # Rows are added in increasing order, so a stable sort by term keeps each posting list sorted.
+        order = np.argsort(terms, kind="stable")
+        self._post_rows, self._post_tfs = rows[order], tfs[order]
+        counts = np.bincount(terms, minlength=len(self._terms))
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._pending_terms, self._pending_rows, self._pending_tfs = [], [], []
+
+    # -- storage --------------------------------------------------------------------------------------------
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._lengths.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(1024, 2 * capacity, needed)
+        lengths = np.zeros(new_capacity, dtype=np.int32)
+        lengths[:capacity] = self._lengths
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:capacity] = self._alive
+        self._lengths, self._alive = lengths, alive
+
+    def save(self) -> None:
+        with self._lock:
+            dead = len(self._ids) - len(self._rows)
+            if self._pending_terms or dead > _COMPACT_RATIO * max(len(self._ids), 1):
+                self._merge(compact=dead > _COMPACT_RATIO * max(len(self._ids), 1))
+            if not self.path:
+                return
+            if not self._dirty:
+                # Writing an unchanged view could undo another process's save.
+                self._writer.release()
+                return
+            size = len(self._ids)
+            postings_tmp = os.path.join(self.path, "postings.tmp.npz")
+            np.savez(
+                postings_tmp,
+                offsets=self._offsets,
+                rows=self._post_rows,
+                tfs=self._post_tfs,
+                lengths=self._lengths[:size],
+                alive=self._alive[:size],
+            )
+            os.replace(postings_tmp, os.path.join(self.path, _POSTINGS_FILE))
+            # The doc table is written last; its mtime tells other processes to reload.
+            meta_path = os.path.join(self.path, _META_FILE)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                terms = sorted(self._terms, key=self._terms.__getitem__)
+                json.dump({"ids": self._ids, "metadata": self._metadata, "terms": terms}, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            self._loaded_mtime = os.stat(meta_path).st_mtime
+            self._dirty = False
+            self._writer.release()
+
+    def load(self) -> None:
+        meta_path = os.path.join(self.path, _META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with self._lock:
+            mtime = os.stat(meta_path).st_mtime
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with np.load(os.path.join(self.path, _POSTINGS_FILE)) as postings:
+                if postings["lengths"].shape[0] != len(meta["ids"]):
+                    # Caught between the writer's two renames; keep the current view and retry later.
+                    return
+                self._offsets = postings["offsets"]
+                self._post_rows = postings["rows"]
+                self._post_tfs = postings["tfs"]
+                self._lengths = postings["lengths"].copy()
+                self._alive = postings["alive"].copy()
+            self._ids = meta["ids"]
+            self._metadata = meta["metadata"]
+            self._terms = {term: term_id for term_id, term in enumerate(meta["terms"])}
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids) if self._alive[row]}
+            self._total_length = int(self._lengths.sum())
+            self._pending_terms, self._pending_rows, self._pending_tfs = [], [], []
+            self._loaded_mtime = mtime
+
+    def refresh(self) -> None:
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(os.path.join(self.path, _META_FILE)).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+
+class LexicalStore:
+    """One LexicalIndex per namespace under ``root``, mirroring LocalIndexStore's layout."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._indexes: dict[str, LexicalIndex] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _index_for(self, namespace: str) -> LexicalIndex:
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                dirname = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace) or "__default__"
+                index = LexicalIndex(os.path.join(self.root, dirname))
+                self._indexes[namespace] = index
+            return index
+
+    def add(self, documents: list[dict], namespace: str = "") -> None:
+        self._index_for(namespace).add(
+            [doc["id"] for doc in documents],
+            [doc["text"] for doc in documents],
+            [doc.get("metadata") or {} for doc in documents],
+            save=False,
+        )
+
+    def delete(self, ids: list[str], namespace: str = "") -> None:
+        self._index_for(namespace).delete(ids, save=False)
+
+    def flush(self, namespace: str = "") -> None:
+        self._index_for(namespace).save()
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        namespace: str = "",
+        filter: dict | None = None,
+        required_terms: list[str] | None = None,
+    ) -> list[tuple[str, float, dict]]:
+        index = self._index_for(namespace)
+        index.refresh()
+        return index.search(query, top_k=top_k, filter=filter, required_terms=required_terms)
+
+    def stats(self) -> dict:
+        return {ns or "__default__": index.stats() for ns, index in self._indexes.items()}
+
+
+def create_store() -> LexicalStore | None:
+    return LexicalStore(LEXICAL_INDEX_DIR) if LEXICAL_INDEX else None
@@ -1,22 +1,51 @@
+import json
 import os
+from typing import AsyncGenerator
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 load_dotenv()
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
 if not NVIDIA_API_KEY:
     raise ValueError("NVIDIA_API_KEY environment variable not set")
 
-client = OpenAI(base_url="https://integrate.api.nvidia.com/v1", api_key=NVIDIA_API_KEY)
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "500"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+# HTTP/2 multiplexes many streams over one connection but needs the optional `h2` package (httpx[http2]).
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
 
 MODEL = "openai/gpt-oss-120b"
+# Context window of MODEL in tokens; prompts are assembled to fit it with MAX_TOKENS left for the reply.
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "131072"))
 MAX_TOKENS = 4512
 ORACLE_MAX_TOKENS = 8192
 ORACLE_TIMEOUT = 60  # seconds
 
+# One pooled HTTP client per worker, shared by every request so concurrent streams reuse connections.
+_http_client = httpx.AsyncClient(
+    http2=LLM_HTTP2,
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    ),
+    timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+)
 
-def stream_response(prompt: str, system_prompt: str | None = None, history: list[dict] | None = None):
+client = AsyncOpenAI(base_url=LLM_BASE_URL, api_key=NVIDIA_API_KEY, http_client=_http_client)
+
+
+async def aclose() -> None:
+    await client.close()
+
+
+def _build_messages(prompt: str, system_prompt: str | None, history: list[dict] | None) -> list[dict]:
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -24,43 +53,48 @@ def stream_response(prompt: str, system_prompt: str | None = None, history: list
         # history should be a list of {"role": "user"|"assistant", "content": "..."}
         messages.extend(history)
     messages.append({"role": "user", "content": prompt})
+    return messages
 
-    response = client.chat.completions.create(
+
+async def stream_response(
+    prompt: str, system_prompt: str | None = None, history: list[dict] | None = None, max_tokens: int = MAX_TOKENS
+) -> AsyncGenerator[str, None]:
+    response = await client.chat.completions.create(
         model=MODEL,
-        messages=messages,
-        max_tokens=MAX_TOKENS,
+        messages=_build_messages(prompt, system_prompt, history),
+        max_tokens=max_tokens,
         stream=True,
     )
 
-    for chunk in response:
-        if chunk.choices and len(chunk.choices) > 0:
-            delta = chunk.choices[0].delta
-            if hasattr(delta, "content") and delta.content:
-                yield delta.content
+    try:
+        async for chunk in response:
+            if chunk.choices and len(chunk.choices) > 0:
+                delta = chunk.choices[0].delta
+                if hasattr(delta, "content") and delta.content:
+                    yield delta.content
+    finally:
+        # Release the pooled connection even if the client disconnects mid-stream.
+        await response.close()
 
 
-def get_response_text(prompt: str, system_prompt: str | None = None, history: list[dict] | None = None) -> str:
+async def get_response_text(
+    prompt: str, system_prompt: str | None = None, history: list[dict] | None = None, max_tokens: int = MAX_TOKENS
+) -> str:
     out = []
-    for chunk_content in stream_response(prompt, system_prompt=system_prompt, history=history):
+    stream = stream_response(prompt, system_prompt=system_prompt, history=history, max_tokens=max_tokens)
+    async for chunk_content in stream:
         out.append(chunk_content)
     return "".join(out)
 
 
-def get_oracle_response_structured(prompt: str, system_prompt: str | None = None, history: list[dict] | None = None) -> dict:
-    import json
-
+async def get_oracle_response_structured(
+    prompt: str, system_prompt: str | None = None, history: list[dict] | None = None
+) -> dict:
     from schemas import OracleAnalysisResponse
 
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    if history:
-        messages.extend(history)
-    messages.append({"role": "user", "content": prompt})
-
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=MODEL,
-        messages=messages,
+        messages=_build_messages(prompt, system_prompt, history),
         max_tokens=ORACLE_MAX_TOKENS,
         response_format={"type": "json_object"},
         temperature=0.1,
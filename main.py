@@ -1,9 +1,10 @@
+import asyncio
 import json
 import os
 from typing import List
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Header, HTTPException, Query, UploadFile
+from fastapi import FastAPI, File, Form, Header, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 
@@ -11,10 +12,18 @@ load_dotenv()
 
 import pinecone_service
 import langgraph_agent
-from pinecone_service import PINECONE_INDEX_NAME
+import llm
+import redis_cache
+import chunk_store
+import embedding_cache
+import file_processor
+import ingestion_jobs
+import retrieval_cache
+import retrieval_router
 import repositories
 import schemas
 import services
+import summaries
 
 app = FastAPI()
 
@@ -41,6 +50,19 @@ app.add_middleware(
 async def startup() -> None:
     await repositories.ensure_indexes()
     pinecone_service.ensure_index()
+    if ingestion_jobs.INGEST_IN_PROCESS_WORKERS:
+        await ingestion_jobs.start_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await ingestion_jobs.stop_workers()
+    # Unfinished summaries are retried after the conversation's next reply.
+    await summaries.stop()
+    await llm.aclose()
+    await redis_cache.aclose()
+    pinecone_service.close()
+    file_processor.close()
 
 
 @app.get("/agents", response_model=List[schemas.AgentOut])
@@ -120,10 +142,12 @@ async def stream_agent_conversation(
     request: schemas.ChatStreamRequest,
     stream: bool = Query(True),
 ):
-    agent = await services.get_agent(agent_id)
+    agent, conversation = await asyncio.gather(
+        services.get_agent(agent_id),
+        services.get_conversation(conversation_id),
+    )
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    conversation = await services.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     if conversation["agent_id"] != agent_id:
@@ -132,14 +156,14 @@ async def stream_agent_conversation(
     if stream:
 
         async def event_stream():
-            async for chunk in services.stream_response(conversation_id, agent, request.content):
+            async for chunk in services.stream_response(conversation_id, agent, request.content, conversation):
                 yield f"data: {json.dumps({'text': chunk})}\n\n"
 
             yield f"event: done\ndata: {json.dumps({'done': True})}\n\n"
 
         return StreamingResponse(event_stream(), media_type="text/event-stream")
 
-    reply = await services.complete_response(conversation_id, agent, request.content)
+    reply = await services.complete_response(conversation_id, agent, request.content, conversation)
     return {"reply": reply}
 
 
@@ -184,13 +208,13 @@ async def add_documents(request: schemas.DocumentAdd):
     from uuid import uuid4
 
     doc_id = str(uuid4())
-    pinecone_service.delete_documents([doc_id])
+    await pinecone_service.delete_documents([doc_id])
     return schemas.DocumentAddResponse(ids=[doc_id])
 
 
 @app.delete("/documents", response_model=schemas.DocumentDeleteResponse)
 async def delete_documents(request: schemas.DocumentDelete):
-    pinecone_service.delete_documents(request.ids)
+    await pinecone_service.delete_documents(request.ids)
     return schemas.DocumentDeleteResponse(deleted=True)
 
 
@@ -212,75 +236,136 @@ def verify_admin_auth(password: str | None) -> bool:
     return password == ADMIN_PASSWORD
 
 
-@app.post("/admin/documents/upload")
-async def upload_document(file: UploadFile = File(...), x_admin_password: str = Header(None)):
+def _parse_scopes(value: str | None) -> list[str] | None:
+    # Form field: comma-separated agent scopes, e.g. "finance,general".
+    scopes = [scope.strip() for scope in (value or "").split(",") if scope.strip()]
+    return scopes or None
+
+
+@app.post("/admin/documents/upload", status_code=202)
+async def upload_document(
+    file: UploadFile | None = File(None),
+    files: List[UploadFile] | None = File(None),
+    namespace: str = Form(""),
+    agent_scopes: str | None = Form(None),
+    x_admin_password: str = Header(None),
+):
     if not verify_admin_auth(x_admin_password):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    import file_processor
+    uploads = ([file] if file else []) + (files or [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files uploaded")
 
-    try:
-        documents = file_processor.process_file(file.file, file.filename)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    for upload in uploads:
+        is_valid, error = file_processor.validate_file(upload.file, upload.filename)
+        if not is_valid:
+            raise HTTPException(status_code=400, detail=f"{upload.filename}: {error}")
 
-    if not documents:
-        raise HTTPException(status_code=400, detail="No content extracted from file")
+    scopes = _parse_scopes(agent_scopes)
+    jobs = await asyncio.gather(
+        *(
+            ingestion_jobs.enqueue_upload(upload.file, upload.filename, namespace=namespace, agent_scopes=scopes)
+            for upload in uploads
+        )
+    )
+    return {
+        "jobs": [{"job_id": job["id"], "filename": job["filename"], "status": job["status"]} for job in jobs],
+    }
 
-    from uuid import uuid4
 
-    doc_ids = []
-    docs_to_upsert = []
-
-    for doc in documents:
-        doc_id = str(uuid4())
-        doc_ids.append(doc_id)
-
-        docs_to_upsert.append(
-            {
-                "id": doc_id,
-                "text": doc.page_content,
-                "metadata": {
-                    **doc.metadata,
-                    "text": doc.page_content,
-                },
-            }
-        )
+@app.put("/admin/documents/{source}", status_code=202)
+async def replace_document(
+    source: str,
+    file: UploadFile = File(...),
+    namespace: str = Form(""),
+    agent_scopes: str | None = Form(None),
+    x_admin_password: str = Header(None),
+):
+    if not verify_admin_auth(x_admin_password):
+        raise HTTPException(status_code=401, detail="Not authenticated")
 
-    pinecone_service.add_documents(docs_to_upsert)
+    is_valid, error = file_processor.validate_file(file.file, file.filename)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=f"{file.filename}: {error}")
 
-    return {
-        "filename": file.filename,
-        "chunks": len(doc_ids),
-        "ids": doc_ids,
-    }
+    job = await ingestion_jobs.enqueue_upload(
+        file.file,
+        file.filename,
+        namespace=namespace,
+        source=source,
+        replace=True,
+        agent_scopes=_parse_scopes(agent_scopes),
+    )
+    return {"job_id": job["id"], "source": source, "status": job["status"]}
 
 
-@app.get("/admin/documents")
-async def list_documents(x_admin_password: str = Header(None)):
+@app.get("/admin/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, x_admin_password: str = Header(None)):
     if not verify_admin_auth(x_admin_password):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    index = pinecone_service.get_index()
+    job = await repositories.get_ingestion_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("path", None)
+    return job
 
-    try:
-        stats = index.describe_index_stats()
-        total_vectors = stats.get("total_vector_count", 0)
-    except Exception:
-        total_vectors = 0
 
-    index_info = pinecone_service.get_index_info()
+@app.get("/admin/documents")
+async def list_documents(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    namespace: str = Query(""),
+    x_admin_password: str = Header(None),
+):
+    if not verify_admin_auth(x_admin_password):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    index_stats, (sources, total_sources) = await asyncio.gather(
+        pinecone_service.get_index_stats(),
+        pinecone_service.list_sources(namespace, offset=offset, limit=limit),
+    )
 
     return {
-        "total_documents": total_vectors,
-        **index_info,
+        **index_stats,
+        "sources": sources,
+        "total_sources": total_sources,
+        "namespace": namespace,
+        "offset": offset,
+        "limit": limit,
     }
 
 
+@app.delete("/admin/documents/sources/{source}")
+async def delete_document_source(source: str, namespace: str = Query(""), x_admin_password: str = Header(None)):
+    if not verify_admin_auth(x_admin_password):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    deleted_chunks = await pinecone_service.delete_source(source, namespace)
+    return {"deleted": True, "source": source, "deleted_chunks": deleted_chunks}
+
+
 @app.delete("/admin/documents/{doc_id}")
-async def delete_document(doc_id: str, x_admin_password: str = Header(None)):
+async def delete_document(doc_id: str, namespace: str = Query(""), x_admin_password: str = Header(None)):
     if not verify_admin_auth(x_admin_password):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    pinecone_service.delete_documents([doc_id])
+    await pinecone_service.delete_documents([doc_id], namespace)
     return {"deleted": True}
+
+
+@app.get("/admin/cache/stats")
+async def cache_stats(x_admin_password: str = Header(None)):
+    if not verify_admin_auth(x_admin_password):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    return {
+        "cache_backend": redis_cache.backend.name,
+        "retrieval": retrieval_cache.stats(),
+        "retrieval_router": retrieval_router.stats(),
+        "query_embeddings": embedding_cache.stats(),
+        "query_embedding_batches": pinecone_service.query_batcher_stats(),
+        "recent_messages": services.recent_messages_stats(),
+        "chunk_texts": chunk_store.stats(),
+    }
@@ -1,95 +1,236 @@
+import asyncio
 import os
-from typing import List
+from typing import AsyncIterable, Iterable, List
 
 from dotenv import load_dotenv
-from langchain_pinecone import PineconeEmbeddings, PineconeVectorStore
-from pinecone import Pinecone
-from pinecone import ServerlessSpec
 
+import chunk_store
+import embedding_cache
+import embeddings
+import ingestion
+import lexical_index
+import repositories
+import retrieval_cache
+import vector_store
+from embedding_batcher import EmbeddingBatcher
+from local_cache import LRUCache
 
 load_dotenv()
 
+# Only needed when the vector store or the embedding provider is Pinecone.
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX")
+# Index description and vector count are remote calls for Pinecone; the admin page reuses them briefly.
+INDEX_STATS_TTL = float(os.getenv("INDEX_STATS_TTL", "30"))
 
-if not PINECONE_API_KEY:
-    raise ValueError("PINECONE_API_KEY environment variable not set")
+_store = vector_store.create_store(PINECONE_API_KEY)
 
-if not PINECONE_INDEX_NAME:
-    raise ValueError("PINECONE_INDEX environment variable not set")
+# Built once per worker: constructing the provider validates the model and sets up its clients.
+_provider = embeddings.create_provider(PINECONE_API_KEY)
+_embedding_model = _provider.model
+# Concurrent cache-missing queries share one batched embedding request.
+_query_batcher = EmbeddingBatcher(_provider.aembed_queries)
+_index_stats = LRUCache(max_entries=1, ttl=INDEX_STATS_TTL)
+# BM25 index over the same chunks, searched without an embedding call; None when LEXICAL_INDEX is off.
+_lexical = lexical_index.create_store()
 
-_pc = Pinecone(api_key=PINECONE_API_KEY)
 
-_index = _pc.Index(PINECONE_INDEX_NAME)
+def get_embeddings() -> embeddings.EmbeddingProvider:
+    return _provider
 
-_embedding_model = "llama-text-embed-v2"
 
+def get_store() -> vector_store.VectorStore:
+    return _store
 
-def get_embeddings():
-    return PineconeEmbeddings(model=_embedding_model)
 
+def chunk_id(text: str, agent_scopes: list[str] | None = None) -> str:
+    # Scopes are part of the identity: the same text ingested for another agent needs its own tagged vector.
+    model = f"{_embedding_model}|{','.join(sorted(agent_scopes))}" if agent_scopes else _embedding_model
+    return ingestion.chunk_id(text, model)
 
-def get_index():
-    return _index
 
+async def add_documents(documents: Iterable[dict] | AsyncIterable[dict], namespace: str = "", on_progress=None) -> dict:
+    """Embed and store documents whose ids come from chunk_id; chunks already in the store are skipped."""
 
-def add_documents(documents: List[dict], namespace: str = ""):
-    embeddings = get_embeddings()
-    texts = [doc["text"] for doc in documents]
-    text_embeddings = embeddings.embed_documents(texts)
+    async def upsert(vectors: List[dict]) -> None:
+        await asyncio.to_thread(_store.upsert, vectors, namespace=namespace)
 
-    vectors = []
-    for i, doc in enumerate(documents):
-        metadata = doc.get("metadata", {})
-        metadata["text"] = doc.get("text", "")
-        vectors.append(
+    async def existing(ids: List[str]) -> set[str]:
+        return await repositories.find_registered_chunks(_store.identity, namespace, ids)
+
+    sources: set[str] = set()
+
+    async def register(batch: List[dict]) -> None:
+        chunks = [
+            {"id": doc["id"], "source": doc.get("metadata", {}).get("source"), "size": len(doc["text"])}
+            for doc in batch
+        ]
+        sources.update(chunk["source"] for chunk in chunks if chunk["source"])
+        await repositories.register_chunks(_store.identity, namespace, chunks)
+        if _lexical is not None:
+            # Batches include chunks skipped as already stored, so re-uploading a file also fills in the
+            # lexical index for chunks ingested before it existed.
+            await asyncio.to_thread(_lexical.add, batch, namespace)
+
+    try:
+        return await ingestion.run_pipeline(
+            documents,
+            _provider.aembed_documents,
+            upsert,
+            on_progress=on_progress,
+            existing=existing,
+            register=register,
+            save_chunks=chunk_store.put_many,
+        )
+    finally:
+        # Some batches may have landed even if a later one failed.
+        await asyncio.to_thread(_store.flush, namespace)
+        if _lexical is not None:
+            await asyncio.to_thread(_lexical.flush, namespace)
+        _index_stats.clear()
+        await retrieval_cache.bump_corpus_version(namespace)
+        await _refresh_sources(sources, namespace)
+
+
+async def replace_source(
+    documents: Iterable[dict] | AsyncIterable[dict], source: str, namespace: str = "", on_progress=None
+) -> dict:
+    """Sync the stored chunks of ``source`` with a new version of it.
+
+    Unchanged chunks are recognised by their content-hash ids and skipped, added or edited chunks are embedded
+    and upserted, and chunks that only the old version used are deleted in one call.
+    """
+    new_ids: set[str] = set()
+
+    async def tracked():
+        async for doc in ingestion.aiter_items(documents):
+            new_ids.add(doc["id"])
+            yield doc
+
+    report = await add_documents(tracked(), namespace=namespace, on_progress=on_progress)
+    previous = await repositories.list_source_chunks(_store.identity, namespace, source)
+    removed = list(previous - new_ids)
+    orphaned = await repositories.release_source_chunks(_store.identity, namespace, source, removed) if removed else []
+    if orphaned:
+        await _delete_vectors(orphaned, namespace)
+    await _refresh_sources({source}, namespace)
+    return {**report, "removed": len(orphaned)}
+
+
+async def delete_source(source: str, namespace: str = "") -> int:
+    """Remove a source: chunks shared with other sources are kept, the rest are deleted in one batched call."""
+    chunk_ids = await repositories.list_source_chunks(_store.identity, namespace, source)
+    orphaned = await repositories.release_source_chunks(_store.identity, namespace, source, list(chunk_ids))
+    if orphaned:
+        await _delete_vectors(orphaned, namespace)
+    await _refresh_sources({source}, namespace)
+    return len(orphaned)
+
+
+async def delete_documents(ids: List[str], namespace: str = ""):
+    sources = await repositories.sources_of_chunks(_store.identity, namespace, ids)
+    await _delete_vectors(ids, namespace)
+    await _refresh_sources(sources, namespace)
+
+
+async def _delete_vectors(ids: List[str], namespace: str) -> None:
+    await asyncio.to_thread(_store.delete, ids, namespace=namespace)
+    await asyncio.to_thread(_store.flush, namespace)
+    if _lexical is not None:
+        await asyncio.to_thread(_lexical.delete, ids, namespace)
+        await asyncio.to_thread(_lexical.flush, namespace)
+    _index_stats.clear()
+    await repositories.unregister_chunks(_store.identity, namespace, ids)
+    await chunk_store.delete_many(ids)
+    await retrieval_cache.bump_corpus_version(namespace)
+
+
+async def _refresh_sources(sources: set[str], namespace: str) -> None:
+    for source in sources:
+        await repositories.refresh_document_source(_store.identity, namespace, source)
+
+
+async def list_sources(namespace: str = "", offset: int = 0, limit: int = 50) -> tuple[List[dict], int]:
+    return await repositories.list_document_sources(_store.identity, namespace, offset=offset, limit=limit)
+
+
+async def similarity_search(
+    query_text: str, top_k: int = 4, namespace: str = "", filter: dict | None = None
+) -> List[dict]:
+    embedding = await embedding_cache.get_query_embedding(query_text, _embedding_model, _query_batcher.embed)
+    matches = await asyncio.to_thread(_store.query, embedding, top_k, namespace=namespace, filter=filter)
+
+    results = []
+    for match in matches:
+        metadata = match["metadata"]
+        results.append(
             {
-                "id": doc["id"],
-                "values": text_embeddings[i],
+                "id": match["id"],
+                # Only vectors ingested before the chunk store carry their text; rag fills in the rest.
+                "text": metadata.pop("text", ""),
+                "score": match["score"],
                 "metadata": metadata,
             }
         )
+    return results
 
-    _index.upsert(vectors=vectors, namespace=namespace)
 
+def has_lexical_index() -> bool:
+    return _lexical is not None
 
-def delete_documents(ids: List[str], namespace: str = ""):
-    _index.delete(ids=ids, namespace=namespace)
 
+async def lexical_search(
+    query_text: str,
+    top_k: int = 4,
+    namespace: str = "",
+    filter: dict | None = None,
+    required_terms: List[str] | None = None,
+) -> List[dict]:
+    """BM25 search over chunk text; same result shape as similarity_search, with text left for rag to fill."""
+    if _lexical is None:
+        return []
+    matches = await asyncio.to_thread(_lexical.search, query_text, top_k, namespace, filter, required_terms)
+    return [
+        {"id": doc_id, "text": "", "score": score, "metadata": dict(metadata)} for doc_id, score, metadata in matches
+    ]
 
-def similarity_search(query_text: str, top_k: int = 4, namespace: str = "") -> List[dict]:
-    embeddings = get_embeddings()
-    vector_store = PineconeVectorStore(index=_index, embedding=embeddings)
 
-    docs = vector_store.similarity_search(query_text, k=top_k, namespace=namespace)
+def lexical_index_stats() -> dict | None:
+    return _lexical.stats() if _lexical is not None else None
 
-    return [
-        {
-            "id": doc.metadata.get("id", ""),
-            "text": doc.page_content,
-            "metadata": doc.metadata,
-        }
-        for doc in docs
-    ]
+
+def query_batcher_stats() -> dict:
+    return _query_batcher.stats()
+
+
+def get_vector_count() -> int:
+    return _store.count()
 
 
 def get_index_info():
-    index_desc = _pc.describe_index(PINECONE_INDEX_NAME)
     return {
-        "index_name": PINECONE_INDEX_NAME,
-        "dimension": index_desc.dimension,
-        "metric": index_desc.metric,
-        "embedding_model": _embedding_model,
-        "endpoint": f"https://{index_desc.host}",
+        **_store.describe(),
+        "vector_store": _store.name,
+        **_provider.info(),
+        "lexical_index": lexical_index_stats(),
     }
 
 
-def ensure_index():
-    existing_indexes = _pc.list_indexes()
-    if PINECONE_INDEX_NAME not in [idx["name"] for idx in existing_indexes]:
-        _pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=1024,
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+async def get_index_stats() -> dict:
+    stats = _index_stats.get("stats")
+    if stats is None:
+        info, count = await asyncio.gather(
+            asyncio.to_thread(get_index_info), asyncio.to_thread(get_vector_count), return_exceptions=True
         )
+        if isinstance(info, BaseException):
+            raise info
+        stats = {"total_documents": 0 if isinstance(count, BaseException) else count, **info}
+        _index_stats.set("stats", stats)
+    return stats
+
+
+def ensure_index():
+    _store.ensure(_provider.dimension)
+
+
+def close():
+    _provider.close()
@@ -262,6 +262,31 @@ Current user query: {current_query}
 
 Please provide a helpful and relevant response based on the conversation context above."""
 
+    @staticmethod
+    def get_conversation_summary_prompt(previous_summary: Optional[str], messages: list) -> str:
+        """
+        Create a prompt that folds older conversation turns into a running summary.
+
+        Args:
+            previous_summary: Summary of the turns before ``messages``, if any
+            messages: Messages to fold in, oldest first
+
+        Returns:
+            Summarization prompt
+        """
+        transcript = "\n".join(
+            f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}" for msg in messages
+        )
+        previous = previous_summary or "(none yet)"
+
+        return f"""Summary of the conversation so far:
+{previous}
+
+New messages:
+{transcript}
+
+{_SUMMARY_INSTRUCTIONS}"""
+
     @staticmethod
     def get_tool_use_prompt(available_tools: list) -> str:
         """
@@ -286,6 +311,17 @@ You have access to the following tools:
 When appropriate, you can use these tools to gather information or perform calculations. Always explain what you're doing when using tools, and provide the results clearly to the user."""
 
 
+_SUMMARY_INSTRUCTIONS = (
+    "Update the summary so it covers the whole conversation. Keep the user's goals, stated facts and preferences, "
+    "decisions made, numbers, names and open questions; drop greetings and repetition. Write compact prose or "
+    "bullet points in the conversation's language, with no preamble."
+)
+CONVERSATION_SUMMARY_SYSTEM_PROMPT = (
+    "You maintain concise running summaries of conversations between a user and an assistant. "
+    "The summary replaces the older messages in later prompts, so it must preserve everything needed to continue."
+)
+
+
 def get_agent_prompt(agent_type: str, context: Optional[Dict[str, Any]] = None) -> str:
     """
     Get the appropriate prompt for an agent type.
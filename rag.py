@@ -1,19 +1,281 @@
+import asyncio
+import os
 from typing import Optional, Any
 
+from dotenv import load_dotenv
+
+import chunk_store
+import lexical_index
 import pinecone_service
+import retrieval_cache
+import tokens
+
+load_dotenv()
 
-DEFAULT_TOP_K = 4
+# Candidates fetched per query; the score threshold and the context budget decide how many are used.
+DEFAULT_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+# Chunks scoring below this similarity are dropped (cosine; 0 keeps everything with a positive score).
+RAG_SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", "0"))
+# Chunks scoring below this fraction of the best match are dropped too, so a strong hit isn't padded with noise.
+RAG_RELATIVE_SCORE = float(os.getenv("RAG_RELATIVE_SCORE", "0.75"))
+# Upper bound on the context placed in the prompt, in RAG_CONTEXT_UNIT ("chars" or estimated "tokens").
+RAG_CONTEXT_BUDGET = int(os.getenv("RAG_CONTEXT_BUDGET", "4000"))
+RAG_CONTEXT_UNIT = os.getenv("RAG_CONTEXT_UNIT", "chars").lower()
+# Fuse dense results with the local BM25 index (reciprocal rank fusion with constant RAG_RRF_K).
+RAG_HYBRID = os.getenv("RAG_HYBRID", "true").lower() in ("1", "true", "yes")
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Queries naming part numbers or codes are answered from the lexical index alone when it has chunks containing
+# every such identifier, skipping the embedding call and vector query.
+RAG_LEXICAL_FAST_PATH = os.getenv("RAG_LEXICAL_FAST_PATH", "true").lower() in ("1", "true", "yes")
+# Leading characters of a chunk used to locate its overlap with the previous chunk when offsets are missing.
+_OVERLAP_PROBE = 32
 
 
 class Document:
-    def __init__(self, page_content: str, metadata: dict = None):
+    def __init__(self, page_content: str, metadata: dict = None, score: float | None = None):
         self.page_content = page_content
         self.metadata = metadata or {}
+        self.score = score
+
+
+def retrieval_options(agent: dict | None) -> dict:
+    """build_rag_prompt arguments for an agent, from the optional ``retrieval`` config on its record.
+
+    Example: {"namespace": "finance", "scopes": ["finance"], "include_unscoped": true, "filter": {...},
+    "top_k": 6, "score_threshold": 0.3, "context_budget": 3000, "enabled": true}. Every key is optional;
+    without config an agent searches the default namespace unfiltered. Scopes match chunks ingested with
+    those agent_scopes, plus untagged chunks unless include_unscoped is false.
+    """
+    config = (agent or {}).get("retrieval") or {}
+    options: dict[str, Any] = {"namespace": config.get("namespace") or ""}
+    if config.get("enabled") is False:
+        options["include_context"] = False
+
+    filters = []
+    if config.get("scopes"):
+        scoped = {"agent_scopes": {"$in": list(config["scopes"])}}
+        if config.get("include_unscoped", True):
+            scoped = {"$or": [scoped, {"agent_scopes": {"$exists": False}}]}
+        filters.append(scoped)
+    if config.get("filter"):
+        filters.append(config["filter"])
+    if filters:
+        options["filter"] = filters[0] if len(filters) == 1 else {"$and": filters}
+
+    if config.get("top_k"):
+        options["top_k"] = int(config["top_k"])
+    if config.get("score_threshold") is not None:
+        options["score_threshold"] = float(config["score_threshold"])
+    if config.get("context_budget"):
+        options["context_budget"] = int(config["context_budget"])
+    return options
+
+
+async def retrieve_context(
+    query: str,
+    top_k: int = DEFAULT_TOP_K,
+    namespace: str = "",
+    filter: dict | None = None,
+    score_threshold: float = RAG_SCORE_THRESHOLD,
+    context_budget: int = RAG_CONTEXT_BUDGET,
+) -> list[Document]:
+    """Most relevant passages for ``query``, best first.
+
+    Up to ``top_k`` chunks are fetched; weak matches are dropped, overlapping or adjacent chunks of the same
+    source are merged into one passage without the repeated overlap, and passages are kept until
+    ``context_budget`` is used up. Each passage carries the best score of its chunks.
+    """
+    version = await retrieval_cache.get_corpus_version(namespace)
+    results = retrieval_cache.get(query, top_k, namespace, version, filter) if version is not None else None
+    if results is None:
+        results = await _search(query, top_k, namespace, filter)
+        results = await _attach_text(results)
+        if version is not None:
+            retrieval_cache.put(query, top_k, namespace, version, results, filter)
+    passages = merge_chunks(select_chunks(results, score_threshold))
+    return fit_to_budget(passages, context_budget)
+
+
+async def _search(query: str, top_k: int, namespace: str, filter: dict | None) -> list[dict]:
+    if not (RAG_HYBRID and pinecone_service.has_lexical_index()):
+        return await pinecone_service.similarity_search(query, top_k=top_k, namespace=namespace, filter=filter)
+
+    identifiers = lexical_index.identifier_terms(query) if RAG_LEXICAL_FAST_PATH else []
+    if identifiers:
+        exact = await pinecone_service.lexical_search(
+            query, top_k=top_k, namespace=namespace, filter=filter, required_terms=identifiers
+        )
+        if exact:
+            return [{**r, "dense_score": None, "lexical_score": r["score"]} for r in exact]
+
+    dense, lexical = await asyncio.gather(
+        pinecone_service.similarity_search(query, top_k=top_k, namespace=namespace, filter=filter),
+        pinecone_service.lexical_search(query, top_k=top_k, namespace=namespace, filter=filter),
+    )
+    return reciprocal_rank_fusion(dense, lexical, top_k)
+
+
+def reciprocal_rank_fusion(dense: list[dict], lexical: list[dict], top_k: int, k: int = RAG_RRF_K) -> list[dict]:
+    """Fuse two ranked lists by summing 1 / (k + rank). Each result keeps the score it had in each list."""
+    fused: dict[str, dict] = {}
+    for key, results in (("dense_score", dense), ("lexical_score", lexical)):
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {
+                    **result,
+                    "score": 0.0,
+                    "dense_score": None,
+                    "lexical_score": None,
+                }
+            elif not entry["text"]:
+                entry["text"] = result["text"]
+            entry["score"] += 1.0 / (k + rank)
+            entry[key] = result["score"]
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:top_k]
+
+
+async def _attach_text(results: list[dict]) -> list[dict]:
+    missing = [r["id"] for r in results if not r["text"]]
+    if not missing:
+        return results
+    texts = await chunk_store.get_many(missing)
+    for r in results:
+        if not r["text"]:
+            r["text"] = texts.get(r["id"], "")
+    return [r for r in results if r["text"]]
+
+
+def _cutoff(scores: list[float], threshold: float) -> float:
+    best = max(scores, default=0.0)
+    return max(threshold, best * RAG_RELATIVE_SCORE) if best > 0 else threshold
+
+
+def select_chunks(results: list[dict], score_threshold: float = RAG_SCORE_THRESHOLD) -> list[dict]:
+    """Drop weak matches. Dense scores are held to the absolute threshold and the relative cutoff, BM25 scores
+    to the relative cutoff only; a fused result stays if either of its scores passes."""
+    dense = [r["dense_score"] if "dense_score" in r else r["score"] for r in results]
+    lexical = [r.get("lexical_score") for r in results]
+    dense_cutoff = _cutoff([d for d in dense if d is not None], score_threshold)
+    lexical_cutoff = _cutoff([s for s in lexical if s is not None], 0.0)
+    return [
+        r
+        for r, d, s in zip(results, dense, lexical)
+        if (d is not None and d >= dense_cutoff) or (s is not None and s >= lexical_cutoff)
+    ]
+
+
+def _position(result: dict) -> tuple:
+    metadata = result.get("metadata") or {}
+    return metadata.get("source") or "", metadata.get("start_offset", -1), metadata.get("chunk_index", -1)
+
+
+def _overlap_length(previous: str, text: str) -> int:
+    # Longest suffix of ``previous`` that ``text`` starts with, found from a short probe of ``text``.
+    probe = text[:_OVERLAP_PROBE]
+    position = previous.find(probe, max(len(previous) - len(text), 0))
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+
+def _same_version(last: dict, metadata: dict) -> bool:
+    # Chunks kept across a document replace keep the offsets of the version they were first ingested from, so
+    # offsets and chunk indexes only line up between chunks written by the same ingestion job.
+    return (
+        "start_offset" in metadata
+        and "end_offset" in last
+        and metadata.get("ingest_id") is not None
+        and metadata["ingest_id"] == last.get("ingest_id")
+    )
+
+
+def _follows(passage: dict, result: dict) -> bool:
+    last, metadata = passage["last"], result.get("metadata") or {}
+    if metadata.get("source") is None or metadata.get("source") != last.get("source"):
+        return False
+    adjacent = metadata.get("chunk_index") is not None and metadata["chunk_index"] == last.get("chunk_index", -2) + 1
+    if _same_version(last, metadata):
+        return adjacent or metadata["start_offset"] <= last["end_offset"]
+    return adjacent
+
+
+def merge_chunks(results: list[dict]) -> list[Document]:
+    """Merge chunks of the same source that overlap or are adjacent, dropping the repeated overlap.
+
+    Offsets recorded at ingestion locate the overlap exactly between chunks of the same ingestion job; other
+    chunks fall back to matching the end of one chunk against the start of the next. Passages are returned best
+    score first.
+    """
+    passages: list[dict] = []
+    seen_texts: set[str] = set()
+    for result in sorted(results, key=_position):
+        text, metadata = result["text"], result.get("metadata") or {}
+        if text in seen_texts:
+            continue
+        seen_texts.add(text)
+        passage = passages[-1] if passages else None
+        if passage is None or not _follows(passage, result):
+            passages.append({"parts": [text], "score": result["score"], "first": metadata, "last": metadata})
+            continue
+
+        last = passage["last"]
+        if _same_version(last, metadata):
+            if metadata["end_offset"] <= last["end_offset"]:
+                continue
+            overlap = max(last["end_offset"] - metadata["start_offset"], 0)
+        else:
+            overlap = _overlap_length(passage["parts"][-1], text)
+        passage["parts"].append(text[overlap:] if overlap else "\n" + text)
+        passage["score"] = max(passage["score"], result["score"])
+        passage["last"] = metadata
+
+    documents = []
+    for passage in sorted(passages, key=lambda p: p["score"], reverse=True):
+        metadata = dict(passage["first"])
+        chunks = len(passage["parts"])
+        if chunks > 1:
+            last = passage["last"]
+            metadata.update(merged_chunks=chunks, chunk_index_end=last.get("chunk_index"))
+            for key in ("end_offset", "page_end"):
+                if key in last:
+                    metadata[key] = last[key]
+        documents.append(Document("".join(passage["parts"]), metadata, score=passage["score"]))
+    return documents
+
+
+def _size(text: str) -> int:
+    return tokens.estimate_tokens(text) if RAG_CONTEXT_UNIT == "tokens" else len(text)
+
+
+def _truncate(text: str, budget: int) -> str:
+    if RAG_CONTEXT_UNIT == "tokens":
+        starts = tokens.token_starts(text)
+        return text if budget >= len(starts) else text[: starts[budget]].rstrip()
+    cut = text[:budget]
+    # Prefer ending on a word boundary.
+    space = cut.rfind(" ")
+    return (cut[:space] if space > budget // 2 else cut).rstrip()
 
 
-def retrieve_context(query: str, top_k: int = DEFAULT_TOP_K) -> list[Document]:
-    results = pinecone_service.similarity_search(query, top_k=top_k)
-    return [Document(page_content=r["text"], metadata=r.get("metadata", {})) for r in results]
+def fit_to_budget(documents: list[Document], budget: int = RAG_CONTEXT_BUDGET) -> list[Document]:
+    """Keep passages in order until the budget is spent; the passage that crosses it is truncated."""
+    if budget <= 0:
+        return documents
+    kept = []
+    remaining = budget
+    for doc in documents:
+        size = _size(doc.page_content)
+        if size > remaining:
+            text = _truncate(doc.page_content, remaining)
+            if text:
+                kept.append(Document(text, {**doc.metadata, "truncated": True}, score=doc.score))
+            break
+        kept.append(doc)
+        remaining -= size
+    return kept
 
 
 def format_context(documents: list[Document]) -> str:
@@ -22,17 +284,28 @@ def format_context(documents: list[Document]) -> str:
     return "\n\n".join([doc.page_content for doc in documents])
 
 
-def build_rag_prompt(
+async def build_rag_prompt(
     query: str,
     system_prompt: Optional[str] = None,
     include_context: bool = True,
     top_k: int = DEFAULT_TOP_K,
+    namespace: str = "",
+    filter: dict | None = None,
+    score_threshold: float = RAG_SCORE_THRESHOLD,
+    context_budget: int = RAG_CONTEXT_BUDGET,
 ) -> tuple[str, list[Document]]:
     context_docs = []
     context_str = ""
 
     if include_context:
-        context_docs = retrieve_context(query, top_k=top_k)
+        context_docs = await retrieve_context(
+            query,
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter,
+            score_threshold=score_threshold,
+            context_budget=context_budget,
+        )
         context_str = format_context(context_docs)
 
     if context_str:
@@ -1,19 +1,211 @@
 import json
 import os
+import time
 from datetime import datetime, timezone
 
-from upstash_redis import Redis
+from dotenv import load_dotenv
 
+load_dotenv()
+
+# Backend selection: "redis" (native protocol, REDIS_URL), "upstash" (REST) or "memory" (tests/local dev).
+# When CACHE_BACKEND is unset, REDIS_URL wins over the Upstash credentials.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "").lower()
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
 UPSTASH_REDIS_REST_URL = os.getenv("UPSTASH_REDIS_REST_URL")
 UPSTASH_REDIS_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
 
-if not UPSTASH_REDIS_REST_URL or not UPSTASH_REDIS_REST_TOKEN:
-    raise ValueError("UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN must be set")
-
 RECENT_MESSAGES_LIMIT = int(os.getenv("RECENT_MESSAGES_LIMIT", "30"))
 RECENT_MESSAGES_TTL = int(os.getenv("RECENT_MESSAGES_TTL", "3600"))
 
-redis_client = Redis(url=UPSTASH_REDIS_REST_URL, token=UPSTASH_REDIS_REST_TOKEN)
+
+class CacheBackend:
+    """Minimal async key/list store used by the caches in this project."""
+
+    name = "base"
+
+    async def push_list(self, key: str, values: list[str], limit: int, ttl: int, replace: bool = False) -> None:
+        raise NotImplementedError
+
+    async def get_list(self, key: str) -> list[str]:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        return None
+
+
+class RedisBackend(CacheBackend):
+    """Native Redis protocol over a pooled redis.asyncio connection pool."""
+
+    name = "redis"
+
+    def __init__(self, url: str, max_connections: int = REDIS_MAX_CONNECTIONS):
+        from redis.asyncio import ConnectionPool, Redis
+
+        self._pool = ConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            decode_responses=True,
+        )
+        self._client = Redis(connection_pool=self._pool)
+
+    async def push_list(self, key: str, values: list[str], limit: int, ttl: int, replace: bool = False) -> None:
+        async with self._client.pipeline(transaction=True) as pipe:
+            if replace:
+                pipe.delete(key)
+            pipe.lpush(key, *values)
+            pipe.ltrim(key, 0, limit - 1)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def get_list(self, key: str) -> list[str]:
+        return await self._client.lrange(key, 0, -1)
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        await self._client.set(key, value, ex=ttl)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._client.delete(*keys)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+        await self._pool.disconnect()
+
+
+class UpstashBackend(CacheBackend):
+    """Upstash REST API; every call is an HTTPS request, so multi-command writes go through MULTI/EXEC."""
+
+    name = "upstash"
+
+    def __init__(self, url: str, token: str):
+        from upstash_redis.asyncio import Redis
+
+        self._client = Redis(url=url, token=token)
+
+    async def push_list(self, key: str, values: list[str], limit: int, ttl: int, replace: bool = False) -> None:
+        transaction = self._client.multi()
+        if replace:
+            transaction.delete(key)
+        transaction.lpush(key, *values)
+        transaction.ltrim(key, 0, limit - 1)
+        transaction.expire(key, ttl)
+        await transaction.exec()
+
+    async def get_list(self, key: str) -> list[str]:
+        return await self._client.lrange(key, 0, -1) or []
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        await self._client.set(key, value, ex=ttl)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._client.delete(*keys)
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+class MemoryBackend(CacheBackend):
+    """Process-local backend with Redis list/TTL semantics, for tests and single-process development."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data: dict[str, object] = {}
+        self._expires: dict[str, float] = {}
+
+    def _live(self, key: str):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _expire(self, key: str, ttl: int | None) -> None:
+        if ttl:
+            self._expires[key] = time.monotonic() + ttl
+        else:
+            self._expires.pop(key, None)
+
+    async def push_list(self, key: str, values: list[str], limit: int, ttl: int, replace: bool = False) -> None:
+        current = [] if replace else list(self._live(key) or [])
+        self._data[key] = (list(reversed(values)) + current)[:limit]
+        self._expire(key, ttl)
+
+    async def get_list(self, key: str) -> list[str]:
+        return list(self._live(key) or [])
+
+    async def get(self, key: str) -> str | None:
+        value = self._live(key)
+        return value if isinstance(value, str) else None
+
+    async def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        self._data[key] = value
+        self._expire(key, ttl)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        self._data[key] = str(value)
+        return value
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+
+def _create_backend() -> CacheBackend:
+    selected = CACHE_BACKEND or ("redis" if REDIS_URL else "upstash")
+    if selected == "memory":
+        return MemoryBackend()
+    if selected == "redis":
+        if not REDIS_URL:
+            raise ValueError("REDIS_URL must be set when CACHE_BACKEND=redis")
+        return RedisBackend(REDIS_URL)
+    if selected == "upstash":
+        if not UPSTASH_REDIS_REST_URL or not UPSTASH_REDIS_REST_TOKEN:
+            raise ValueError("UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN must be set")
+        return UpstashBackend(UPSTASH_REDIS_REST_URL, UPSTASH_REDIS_REST_TOKEN)
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+
+
+backend = _create_backend()
+
+
+async def aclose() -> None:
+    await backend.aclose()
+
+
+def _recent_key(conversation_id: str) -> str:
+    return f"recent_messages:{conversation_id}"
 
 
 def _serialize_message(message: dict) -> str:
@@ -30,18 +222,31 @@ def _deserialize_message(raw: str) -> dict:
     return data
 
 
-def cache_recent_message(conversation_id: str, message: dict) -> None:
-    key = f"recent_messages:{conversation_id}"
-    redis_client.lpush(key, _serialize_message(message))
-    redis_client.ltrim(key, 0, RECENT_MESSAGES_LIMIT - 1)
-    redis_client.expire(key, RECENT_MESSAGES_TTL)
+async def cache_messages(conversation_id: str, messages: list[dict], replace: bool = False) -> None:
+    # Push (oldest first), trim and refresh the TTL in one round trip; replace=True backfills after a miss.
+    if not messages:
+        return
+    await backend.push_list(
+        _recent_key(conversation_id),
+        [_serialize_message(message) for message in messages],
+        limit=RECENT_MESSAGES_LIMIT,
+        ttl=RECENT_MESSAGES_TTL,
+        replace=replace,
+    )
+
 
+async def cache_recent_message(conversation_id: str, message: dict) -> None:
+    await cache_messages(conversation_id, [message])
 
-def get_recent_messages(conversation_id: str) -> list[dict]:
-    key = f"recent_messages:{conversation_id}"
-    data = redis_client.lrange(key, 0, -1)
+
+async def get_recent_messages(conversation_id: str) -> list[dict]:
+    data = await backend.get_list(_recent_key(conversation_id))
     if not data:
         return []
     messages = [_deserialize_message(item) for item in data]
     messages.reverse()
     return messages
+
+
+async def invalidate_recent_messages(conversation_id: str) -> None:
+    await backend.delete(_recent_key(conversation_id))
@@ -1,8 +1,8 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from bson import ObjectId
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
 
 from mongo import db
 
@@ -30,6 +30,16 @@ async def ensure_indexes() -> None:
     await db.conversations.create_index([("session_id", ASCENDING)])
     await db.conversations.create_index([("last_activity_at", ASCENDING)], expireAfterSeconds=604800)  # 7 days TTL
     await db.messages.create_index([("conversation_id", ASCENDING), ("created_at", DESCENDING)])
+    await db.ingestion_jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    await db.chunk_registry.create_index(
+        [("store", ASCENDING), ("namespace", ASCENDING), ("chunk_id", ASCENDING)], unique=True
+    )
+    await db.chunk_registry.create_index([("store", ASCENDING), ("namespace", ASCENDING), ("sources", ASCENDING)])
+    await db.chunk_registry.create_index([("chunk_id", ASCENDING)])
+    await db.document_sources.create_index(
+        [("store", ASCENDING), ("namespace", ASCENDING), ("source", ASCENDING)], unique=True
+    )
+    await db.document_sources.create_index([("store", ASCENDING), ("namespace", ASCENDING), ("updated_at", DESCENDING)])
 
 
 async def list_agents() -> list[dict[str, Any]]:
@@ -91,6 +101,17 @@ async def update_conversation_timestamp(conversation_id: str) -> None:
     )
 
 
+async def update_conversation_summary(
+    conversation_id: str, summary: dict[str, Any], previous_message_id: str | None
+) -> bool:
+    # Compare-and-set on the last summarized message, so concurrent compactions can't overwrite a newer summary.
+    result = await db.conversations.update_one(
+        {"_id": _to_object_id(conversation_id), "summary.last_message_id": previous_message_id},
+        {"$set": {"summary": summary}},
+    )
+    return result.modified_count == 1
+
+
 async def get_conversation_by_session_agent(session_id: str, agent_id: str) -> dict[str, Any] | None:
     convo = await db.conversations.find_one(
         {
@@ -170,6 +191,22 @@ async def list_messages(conversation_id: str, limit: int = 50) -> list[dict[str,
     return messages
 
 
+async def list_messages_after(
+    conversation_id: str, after: datetime | None = None, limit: int = 200
+) -> list[dict[str, Any]]:
+    """Oldest-first messages created after ``after`` (all messages when None)."""
+    query: dict[str, Any] = {"conversation_id": _to_object_id(conversation_id)}
+    if after is not None:
+        query["created_at"] = {"$gt": after}
+    cursor = db.messages.find(query).sort("created_at", ASCENDING).limit(limit)
+    messages = []
+    async for message in cursor:
+        doc = _serialize_id(message)
+        doc["conversation_id"] = str(doc["conversation_id"])
+        messages.append(doc)
+    return messages
+
+
 async def create_message(
     conversation_id: str,
     role: str,
@@ -188,3 +225,171 @@ async def create_message(
     payload["conversation_id"] = str(payload["conversation_id"])
     payload.pop("_id", None)
     return payload
+
+
+async def create_ingestion_job(job: dict[str, Any]) -> dict[str, Any]:
+    now = _now()
+    payload = {
+        **job,
+        "status": "queued",
+        "progress": {
+            "pages_parsed": 0,
+            "chunks": 0,
+            "chunks_skipped": 0,
+            "chunks_embedded": 0,
+            "vectors_upserted": 0,
+        },
+        "error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = await db.ingestion_jobs.insert_one(payload)
+    payload["id"] = str(result.inserted_id)
+    payload.pop("_id", None)
+    return payload
+
+
+async def get_ingestion_job(job_id: str) -> dict[str, Any] | None:
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await db.ingestion_jobs.find_one({"_id": _to_object_id(job_id)})
+    return _serialize_id(job) if job else None
+
+
+async def claim_ingestion_job(worker_id: str, stale_seconds: int) -> dict[str, Any] | None:
+    # Atomic transition to running, so each job goes to exactly one worker. Running jobs whose heartbeat is older
+    # than ``stale_seconds`` were orphaned by a dead worker and are claimed again.
+    now = _now()
+    stale = {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=stale_seconds)}}
+    job = await db.ingestion_jobs.find_one_and_update(
+        {"$or": [{"status": "queued"}, stale]},
+        {
+            "$set": {"status": "running", "worker_id": worker_id, "started_at": now, "updated_at": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return _serialize_id(job) if job else None
+
+
+async def update_ingestion_job(job_id: str, fields: dict[str, Any]) -> None:
+    await db.ingestion_jobs.update_one(
+        {"_id": _to_object_id(job_id)},
+        {"$set": {**fields, "updated_at": _now()}},
+    )
+
+
+async def find_registered_chunks(store: str, namespace: str, chunk_ids: list[str]) -> set[str]:
+    cursor = db.chunk_registry.find(
+        {"store": store, "namespace": namespace, "chunk_id": {"$in": chunk_ids}},
+        {"chunk_id": 1, "_id": 0},
+    )
+    return {doc["chunk_id"] async for doc in cursor}
+
+
+async def register_chunks(store: str, namespace: str, chunks: list[dict[str, Any]]) -> None:
+    now = _now()
+    operations = []
+    for chunk in chunks:
+        update: dict[str, Any] = {"$setOnInsert": {"created_at": now, "size": chunk.get("size", 0)}}
+        if chunk.get("source"):
+            update["$addToSet"] = {"sources": chunk["source"]}
+        operations.append(
+            UpdateOne({"store": store, "namespace": namespace, "chunk_id": chunk["id"]}, update, upsert=True)
+        )
+    if operations:
+        await db.chunk_registry.bulk_write(operations, ordered=False)
+
+
+async def unregister_chunks(store: str, namespace: str, chunk_ids: list[str]) -> None:
+    await db.chunk_registry.delete_many({"store": store, "namespace": namespace, "chunk_id": {"$in": chunk_ids}})
+
+
+async def list_source_chunks(store: str, namespace: str, source: str) -> set[str]:
+    cursor = db.chunk_registry.find(
+        {"store": store, "namespace": namespace, "sources": source},
+        {"chunk_id": 1, "_id": 0},
+    )
+    return {doc["chunk_id"] async for doc in cursor}
+
+
+async def release_source_chunks(store: str, namespace: str, source: str, chunk_ids: list[str]) -> list[str]:
+    # Detach the source from these chunks; those no other source still uses are removed and returned.
+    query = {"store": store, "namespace": namespace, "chunk_id": {"$in": chunk_ids}}
+    await db.chunk_registry.update_many(query, {"$pull": {"sources": source}})
+    orphaned_query = {**query, "sources": {"$size": 0}}
+    orphaned = [doc["chunk_id"] async for doc in db.chunk_registry.find(orphaned_query, {"chunk_id": 1, "_id": 0})]
+    if orphaned:
+        await db.chunk_registry.delete_many({**query, "chunk_id": {"$in": orphaned}})
+    return orphaned
+
+
+async def sources_of_chunks(store: str, namespace: str, chunk_ids: list[str]) -> set[str]:
+    query = {"store": store, "namespace": namespace, "chunk_id": {"$in": chunk_ids}}
+    return set(await db.chunk_registry.distinct("sources", query))
+
+
+async def refresh_document_source(store: str, namespace: str, source: str) -> dict[str, Any] | None:
+    # Recompute a source's summary from its registered chunks; drop it once no chunks are left.
+    key = {"store": store, "namespace": namespace, "source": source}
+    pipeline = [
+        {"$match": {"store": store, "namespace": namespace, "sources": source}},
+        {"$group": {"_id": None, "chunk_count": {"$sum": 1}, "total_chars": {"$sum": "$size"}}},
+    ]
+    summary = None
+    async for row in await db.chunk_registry.aggregate(pipeline):
+        summary = row
+    if summary is None:
+        await db.document_sources.delete_one(key)
+        return None
+
+    now = _now()
+    doc = await db.document_sources.find_one_and_update(
+        key,
+        {
+            "$set": {"chunk_count": summary["chunk_count"], "total_chars": summary["total_chars"], "updated_at": now},
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return _serialize_id(doc)
+
+
+async def list_document_sources(
+    store: str, namespace: str, offset: int = 0, limit: int = 50
+) -> tuple[list[dict[str, Any]], int]:
+    query = {"store": store, "namespace": namespace}
+    cursor = db.document_sources.find(query).sort("updated_at", DESCENDING).skip(offset).limit(limit)
+    sources = [_serialize_id(doc) async for doc in cursor]
+    return sources, await db.document_sources.count_documents(query)
+
+
+async def get_document_source(store: str, namespace: str, source: str) -> dict[str, Any] | None:
+    doc = await db.document_sources.find_one({"store": store, "namespace": namespace, "source": source})
+    return _serialize_id(doc) if doc else None
+
+
+async def save_chunk_texts(texts: dict[str, str]) -> None:
+    now = _now()
+    operations = [
+        UpdateOne({"_id": chunk_id}, {"$setOnInsert": {"text": text, "created_at": now}}, upsert=True)
+        for chunk_id, text in texts.items()
+    ]
+    if operations:
+        await db.chunk_texts.bulk_write(operations, ordered=False)
+
+
+async def get_chunk_texts(chunk_ids: list[str]) -> dict[str, str]:
+    cursor = db.chunk_texts.find({"_id": {"$in": chunk_ids}}, {"text": 1})
+    return {doc["_id"]: doc["text"] async for doc in cursor}
+
+
+async def delete_chunk_texts(chunk_ids: list[str]) -> None:
+    # Text is shared by every store and namespace holding the same chunk; only drop unreferenced ids.
+    referenced = set(await db.chunk_registry.distinct("chunk_id", {"chunk_id": {"$in": chunk_ids}}))
+    unreferenced = [chunk_id for chunk_id in chunk_ids if chunk_id not in referenced]
+    if unreferenced:
+        await db.chunk_texts.delete_many({"_id": {"$in": unreferenced}})
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+
+import redis_cache
+from embedding_cache import normalize_query
+from local_cache import LRUCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "5000"))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Entries are invalidated by the corpus version; the TTL only bounds memory held by cold queries.
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+# How long a worker trusts its last read of the corpus version; another worker's bump is seen after at most this.
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "2"))
+
+
+def _results_size(results: list[dict]) -> int:
+    return sum(len(r.get("text") or "") + 512 for r in results)
+
+
+_local = LRUCache(
+    max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+    max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+    ttl=RETRIEVAL_CACHE_TTL,
+    sizeof=_results_size,
+)
+_versions = LRUCache(max_entries=1024, ttl=CORPUS_VERSION_TTL)
+
+
+def _version_key(namespace: str) -> str:
+    return f"corpus_version:{namespace or '__default__'}"
+
+
+async def get_corpus_version(namespace: str = "") -> int | None:
+    # The counter lives in the shared cache backend so a bump in one worker invalidates every worker.
+    version = _versions.get(namespace)
+    if version is not None:
+        return version
+    try:
+        raw = await redis_cache.backend.get(_version_key(namespace))
+    except Exception:
+        logger.warning("Corpus version read failed; bypassing retrieval cache", exc_info=True)
+        return None
+    version = int(raw) if raw else 0
+    _versions.set(namespace, version)
+    return version
+
+
+async def bump_corpus_version(namespace: str = "") -> None:
+    try:
+        _versions.set(namespace, await redis_cache.backend.incr(_version_key(namespace)))
+    except Exception:
+        _versions.pop(namespace)
+        logger.error("Corpus version bump failed; cached retrievals may be stale until they expire", exc_info=True)
+
+
+def _cache_key(query: str, top_k: int, namespace: str, version: int, filter: dict | None) -> tuple:
+    filter_key = json.dumps(filter, sort_keys=True) if filter else None
+    return (normalize_query(query), top_k, namespace, filter_key, version)
+
+
+def get(query: str, top_k: int, namespace: str, version: int, filter: dict | None = None) -> list[dict] | None:
+    return _local.get(_cache_key(query, top_k, namespace, version, filter))
+
+
+def put(query: str, top_k: int, namespace: str, version: int, results: list[dict], filter: dict | None = None) -> None:
+    _local.set(_cache_key(query, top_k, namespace, version, filter), results)
+
+
+def stats() -> dict:
+    return _local.stats()
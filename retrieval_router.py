@@ -0,0 +1,140 @@
+import os
+import re
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "auto" routes each turn, "always" restores unconditional retrieval and "never" disables it.
+# Agents override this with "route" in their retrieval config.
+RETRIEVAL_ROUTE_MODE = os.getenv("RETRIEVAL_ROUTE_MODE", "auto").lower()
+# Turns the classifier scores below this skip retrieval. The default retrieves for a single content word or a
+# question mark, so only chatter and acknowledgements skip; raise it to skip more eagerly.
+RETRIEVAL_ROUTE_THRESHOLD = float(os.getenv("RETRIEVAL_ROUTE_THRESHOLD", "0.25"))
+# Weight of the newest sample in the running retrieval latency used to estimate the time a skip saves.
+_LATENCY_SMOOTHING = 0.2
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Turns made only of these words are greetings, thanks or acknowledgements.
+_SMALLTALK = frozenset(
+    """hi hello hey heya yo hiya morning afternoon evening night good goodnight bye goodbye cya later see you
+    thanks thank thx ty cheers appreciate appreciated it much so very a lot lots ok okay k kk cool great nice
+    awesome perfect amazing wonderful excellent got understood sounds fine sure yes yeah yep yup no nope nah
+    alright right lol haha hahaha wow oh ah hmm welcome np problem that's thats all for now bad please worries
+    i makes sense""".split()
+)
+# Short requests to rework the previous answer; the context it was built from is already in the history. The
+# pronoun must be the verb's object and may only be followed by format words ("make it shorter", "translate that
+# into Spanish"), so "summarize the policy in that document" or "put together this checklist" are still scored.
+_FOLLOW_UP = re.compile(
+    r"^(?:please |can you |could you |now )*(?:"
+    r"(?:make|rewrite|rephrase|reword|shorten|summari[sz]e|translate|expand(?: on)?|simplify|format|convert|turn|"
+    r"put|redo|say) (?:it|that|this|those|them|the above|the previous(?: answer| response| one)?)"
+    r"(?: (?:to|into|in|as|more|less|a|much|shorter|longer|simpler|clearer|again|please|for)\b.*)?"
+    r"|continue|go on|keep going|try again"
+    r")[\s.!?]*$"
+)
+_FOLLOW_UP_MAX_WORDS = 12
+
+_QUESTION_CUES = frozenset(
+    """what how why when where which who whom whose explain describe list compare define tell show find does do
+    is are can should could would will cost costs price prices requirement requirements policy rules difference
+    recommend best steps guide""".split()
+)
+_CONVERSATIONAL = frozenset("thanks thank ok okay cool nice great lol haha love awesome wow hmm interesting".split())
+_STOPWORDS = frozenset(
+    """the a an and or but of to in on at for with from by about as into than then that this these those it its
+    be been being have has had was were i me my we our you your he she they them their there here just also
+    some any all more most very really please would could should will shall might must""".split()
+)
+
+
+class RouteDecision(NamedTuple):
+    retrieve: bool
+    reason: str
+    score: float | None = None
+
+
+def _agent_mode(agent: dict | None) -> str:
+    config = (agent or {}).get("retrieval") or {}
+    if config.get("enabled") is False:
+        return "never"
+    return (config.get("route") or RETRIEVAL_ROUTE_MODE).lower()
+
+
+def classify(prompt: str) -> float:
+    """Linear score over lexical features: positive for information-seeking turns, negative for chatter."""
+    words = _WORD.findall(prompt.lower())
+    score = 0.0
+    if "?" in prompt:
+        score += 1.0
+    if any(word in _QUESTION_CUES for word in words):
+        score += 1.0
+    content = [w for w in words if len(w) >= 3 and w not in _STOPWORDS and w not in _CONVERSATIONAL]
+    score += min(0.25 * len(content), 2.0)
+    if any(ch.isdigit() for ch in prompt):
+        score += 0.5
+    # Capitalised words after the first usually name products, places or documents.
+    if any(token[:1].isupper() for token in prompt.split()[1:]):
+        score += 0.5
+    score -= 1.0 * sum(1 for word in words if word in _CONVERSATIONAL)
+    return score
+
+
+def route(prompt: str, agent: dict | None = None) -> RouteDecision:
+    """Decide whether a turn needs retrieval, using only local heuristics (no network, microseconds)."""
+    mode = _agent_mode(agent)
+    if mode == "never":
+        return RouteDecision(False, "agent_policy")
+    if mode == "always":
+        return RouteDecision(True, "agent_policy")
+
+    text = prompt.strip().lower()
+    words = _WORD.findall(text)
+    if not words or all(word in _SMALLTALK for word in words):
+        return RouteDecision(False, "smalltalk")
+    if len(words) <= _FOLLOW_UP_MAX_WORDS and _FOLLOW_UP.match(text):
+        return RouteDecision(False, "follow_up")
+
+    config = (agent or {}).get("retrieval") or {}
+    threshold = config.get("route_threshold")
+    threshold = RETRIEVAL_ROUTE_THRESHOLD if threshold is None else float(threshold)
+    score = round(classify(prompt), 2)
+    return RouteDecision(score >= threshold, "classifier", score)
+
+
+_stats = {"retrieved": 0, "skipped": 0, "saved_ms": 0.0}
+_reasons: dict[str, int] = {}
+_retrieval_ms: float | None = None
+
+
+def record_retrieval(elapsed_ms: float) -> None:
+    global _retrieval_ms
+    _stats["retrieved"] += 1
+    if _retrieval_ms is None:
+        _retrieval_ms = elapsed_ms
+    else:
+        _retrieval_ms += _LATENCY_SMOOTHING * (elapsed_ms - _retrieval_ms)
+
+
+def record_skip(decision: RouteDecision) -> float | None:
+    """Count a skipped retrieval; returns the time it saved, estimated from recent retrieval latency."""
+    _stats["skipped"] += 1
+    _reasons[decision.reason] = _reasons.get(decision.reason, 0) + 1
+    if _retrieval_ms is None:
+        return None
+    _stats["saved_ms"] += _retrieval_ms
+    return round(_retrieval_ms, 1)
+
+
+def stats() -> dict:
+    total = _stats["retrieved"] + _stats["skipped"]
+    return {
+        **_stats,
+        "saved_ms": round(_stats["saved_ms"], 1),
+        "skip_rate": _stats["skipped"] / total if total else 0.0,
+        "skip_reasons": dict(_reasons),
+        "avg_retrieval_ms": round(_retrieval_ms, 1) if _retrieval_ms is not None else None,
+    }
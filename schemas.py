@@ -3,12 +3,29 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 
 
+class AgentRetrieval(BaseModel):
+    namespace: str | None = None
+    scopes: list[str] | None = None
+    include_unscoped: bool = True
+    filter: dict | None = None
+    top_k: int | None = Field(None, ge=1, le=50)
+    score_threshold: float | None = None
+    context_budget: int | None = Field(None, ge=1)
+    enabled: bool = True
+    # "auto" (default), "always" or "never": whether retrieval_router may skip retrieval for this agent.
+    route: str | None = Field(None, pattern="^(auto|always|never)$")
+    route_threshold: float | None = None
+
+
 class AgentBase(BaseModel):
     name: str = Field(..., min_length=2, max_length=80)
     description: str | None = Field(None, max_length=300)
     system_prompt: str = Field(..., min_length=5)
     color: str | None = Field(None, max_length=20)
     icon: str | None = Field(None, max_length=40)
+    retrieval: AgentRetrieval | None = None
+    # Tokens of past messages sent with each turn; defaults to HISTORY_TOKEN_BUDGET.
+    history_token_budget: int | None = Field(None, ge=0)
 
 
 class AgentOut(AgentBase):
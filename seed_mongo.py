@@ -16,6 +16,7 @@ AGENTS = [
         "name": "Travel Agent",
         "description": "Trip planning, destinations, itineraries, and travel advice.",
         "agent_type": "travel",
+        "retrieval": {"scopes": ["travel"]},
         "color": "blue",
         "icon": "🌍",
     },
@@ -23,6 +24,7 @@ AGENTS = [
         "name": "Construction Agent",
         "description": "Construction planning, materials, safety, and best practices.",
         "agent_type": "construction",
+        "retrieval": {"scopes": ["construction"]},
         "color": "orange",
         "icon": "🏗️",
     },
@@ -30,6 +32,7 @@ AGENTS = [
         "name": "Finance Agent",
         "description": "Personal finance, budgeting, investing, and planning.",
         "agent_type": "finance",
+        "retrieval": {"scopes": ["finance"]},
         "color": "green",
         "icon": "💰",
     },
@@ -58,6 +61,7 @@ async def seed_agents() -> None:
             "system_prompt": system_prompt,
             "color": agent["color"],
             "icon": agent["icon"],
+            "retrieval": agent.get("retrieval"),
             "updated_at": utc_now(),
         }
 
@@ -1,11 +1,39 @@
+import asyncio
+import os
 from typing import AsyncGenerator
 
+import history
 import langgraph_agent
 import redis_cache
 import repositories
+import summaries
+from local_cache import LRUCache
 
 MAX_CONVERSATIONS_PER_SESSION = 10
 
+# Worker-local first tier in front of the Redis recent-message list. The TTL bounds how stale an entry can get
+# when another worker appends to the same conversation.
+LOCAL_HISTORY_MAX_CONVERSATIONS = int(os.getenv("LOCAL_HISTORY_MAX_CONVERSATIONS", "1000"))
+LOCAL_HISTORY_MAX_BYTES = int(os.getenv("LOCAL_HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))
+LOCAL_HISTORY_TTL = float(os.getenv("LOCAL_HISTORY_TTL", "120"))
+
+
+def _history_size(messages: list[dict]) -> int:
+    # Rough footprint: content dominates, plus a fixed allowance for ids, timestamps and metadata.
+    return sum(len(msg.get("content") or "") + 256 for msg in messages)
+
+
+_recent_messages = LRUCache(
+    max_entries=LOCAL_HISTORY_MAX_CONVERSATIONS,
+    max_bytes=LOCAL_HISTORY_MAX_BYTES,
+    ttl=LOCAL_HISTORY_TTL,
+    sizeof=_history_size,
+)
+
+
+def recent_messages_stats() -> dict:
+    return _recent_messages.stats()
+
 
 async def list_agents():
     return await repositories.list_agents()
@@ -38,11 +66,16 @@ async def list_conversations(session_id: str, include_archived: bool = False):
 
 
 async def archive_conversation(conversation_id: str):
+    _recent_messages.pop(conversation_id)
     return await repositories.archive_conversation(conversation_id)
 
 
 async def delete_conversation(conversation_id: str):
-    return await repositories.delete_conversation(conversation_id)
+    _recent_messages.pop(conversation_id)
+    deleted = await repositories.delete_conversation(conversation_id)
+    if deleted:
+        await redis_cache.invalidate_recent_messages(conversation_id)
+    return deleted
 
 
 async def get_conversation(conversation_id: str):
@@ -50,15 +83,21 @@ async def get_conversation(conversation_id: str):
 
 
 async def list_messages(conversation_id: str, limit: int = 50):
-    cached = redis_cache.get_recent_messages(conversation_id)
+    local = _recent_messages.get(conversation_id)
+    if local:
+        return local[-limit:]
+
+    cached = await redis_cache.get_recent_messages(conversation_id)
     if cached:
+        _recent_messages.set(conversation_id, cached)
         return cached[-limit:]
 
-    # Fetch from MongoDB and populate cache
-    messages = await repositories.list_messages(conversation_id, limit=limit)
-    for msg in messages:
-        redis_cache.cache_recent_message(conversation_id, msg)
-    return messages
+    # Fetch from MongoDB and backfill the whole recent window in a single cache round trip
+    messages = await repositories.list_messages(conversation_id, limit=max(limit, redis_cache.RECENT_MESSAGES_LIMIT))
+    await redis_cache.cache_messages(conversation_id, messages, replace=True)
+    if messages:
+        _recent_messages.set(conversation_id, messages[-redis_cache.RECENT_MESSAGES_LIMIT :])
+    return messages[-limit:]
 
 
 async def append_message(
@@ -71,6 +110,7 @@ async def append_message(
 ):
     if not metadata:
         metadata = {}
+    metadata["tokens"] = history.count_tokens(content)
     if rag_used:
         metadata["rag_used"] = rag_used
         metadata["rag_docs_count"] = rag_docs_count
@@ -81,31 +121,87 @@ async def append_message(
         content=content,
         metadata=metadata,
     )
-    redis_cache.cache_recent_message(conversation_id, message)
-    await repositories.update_conversation_timestamp(conversation_id)
+    # Write-through: only extend a local window we already hold, since a partial one would hide older messages.
+    local = _recent_messages.get(conversation_id, count=False)
+    if local is not None:
+        _recent_messages.set(conversation_id, (local + [message])[-redis_cache.RECENT_MESSAGES_LIMIT :])
+    await asyncio.gather(
+        redis_cache.cache_recent_message(conversation_id, message),
+        repositories.update_conversation_timestamp(conversation_id),
+    )
     return message
 
 
+async def _persist_after(history_task: asyncio.Task, conversation_id: str, role: str, content: str):
+    # Writing the user message only once history has been read keeps it out of that history and means the
+    # write-through to the recent-message caches can never race the read that fills them.
+    await asyncio.wait({history_task})
+    return await append_message(conversation_id, role, content)
+
+
+async def _prepare_turn(
+    conversation_id: str, agent: dict, user_content: str, conversation: dict | None
+) -> tuple[list[dict], str | None, tuple, dict, asyncio.Task]:
+    """Loads history and retrieval for a turn.
+
+    Returns the history to send, the system prompt (with the conversation summary, if any), the retrieval, the
+    metadata stored with the reply, and the task persisting the user message.
+    """
+    # History load and retrieval run concurrently and are all the LLM call waits on. Persisting the user
+    # message overlaps with retrieval and generation and is awaited before the reply is stored.
+    # The whole cached recent window is loaded; the token budget decides how much of it is sent.
+    history_task = asyncio.create_task(list_messages(conversation_id, limit=redis_cache.RECENT_MESSAGES_LIMIT))
+    retrieval_task = asyncio.create_task(langgraph_agent.routed_retrieve(user_content, agent))
+    persist_task = asyncio.create_task(_persist_after(history_task, conversation_id, "user", user_content))
+    try:
+        if conversation is None:
+            conversation = await get_conversation(conversation_id)
+        raw_history, (retrieval, route) = await asyncio.gather(history_task, retrieval_task)
+    except BaseException:
+        # Without a reply the user message isn't stored either; gathering retrieves the tasks' exceptions.
+        tasks = (history_task, retrieval_task, persist_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    # Messages already covered by the rolling summary are replaced by it.
+    summary = (conversation or {}).get("summary")
+    system_prompt = history.with_summary((agent or {}).get("system_prompt"), summary)
+    raw_history = history.after_summary(raw_history, summary)
+
+    # The system prompt, RAG context and new message always go in; history gets what is left of the budget.
+    # The RAG prompt already contains the new message.
+    reserved = sum(
+        history.count_tokens(text) + history.MESSAGE_TOKEN_OVERHEAD
+        for text in (system_prompt, retrieval[0] or user_content)
+    )
+    budget = history.available_tokens(agent, reserved)
+    formatted_history, used = history.fit_history(raw_history, budget)
+    metadata = {
+        "retrieval_route": route,
+        "history": {
+            "messages": len(formatted_history),
+            "tokens": used,
+            "budget": budget,
+            "summary_tokens": summary.get("tokens", 0) if summary else 0,
+        },
+    }
+    return formatted_history, system_prompt, retrieval, metadata, persist_task
+
+
 async def stream_response(
     conversation_id: str,
     agent: dict,
     user_content: str,
+    conversation: dict | None = None,
 ) -> AsyncGenerator[str, None]:
-    # Fetch recent history for context (before adding current message)
-    # We use a limit, e.g., 20 messages.
-    raw_history = await list_messages(conversation_id, limit=20)
-    formatted_history = []
-    for msg in raw_history:
-        role = msg.get("role")
-        content = msg.get("content")
-        if role in ["user", "assistant"] and content:
-            formatted_history.append({"role": role, "content": content})
-
-    await append_message(conversation_id, "user", user_content)
-    system_prompt = agent.get("system_prompt") if agent else None
+    formatted_history, system_prompt, retrieval, metadata, persist_task = await _prepare_turn(
+        conversation_id, agent, user_content, conversation
+    )
 
     stream_generator, rag_used, rag_docs_count = await langgraph_agent.stream_agent(
-        user_content, system_prompt=system_prompt, history=formatted_history
+        user_content, system_prompt=system_prompt, history=formatted_history, retrieval=retrieval
     )
 
     collected = []
@@ -113,30 +209,37 @@ async def stream_response(
         collected.append(chunk)
         yield chunk
 
+    await persist_task
     if collected:
         await append_message(
-            conversation_id, "assistant", "".join(collected), rag_used=rag_used, rag_docs_count=rag_docs_count
+            conversation_id,
+            "assistant",
+            "".join(collected),
+            metadata=metadata,
+            rag_used=rag_used,
+            rag_docs_count=rag_docs_count,
         )
+    # Compaction runs after the reply has streamed, so it never delays a response.
+    summaries.schedule(conversation_id, (conversation or {}).get("summary"))
 
 
-async def complete_response(conversation_id: str, agent: dict, user_content: str) -> str:
-    # Fetch recent history for context
-    raw_history = await list_messages(conversation_id, limit=20)
-    formatted_history = []
-    for msg in raw_history:
-        role = msg.get("role")
-        content = msg.get("content")
-        if role in ["user", "assistant"] and content:
-            formatted_history.append({"role": role, "content": content})
-
-    await append_message(conversation_id, "user", user_content)
-    system_prompt = agent.get("system_prompt") if agent else None
-    response = await langgraph_agent.invoke_agent(user_content, system_prompt=system_prompt, history=formatted_history)
+async def complete_response(
+    conversation_id: str, agent: dict, user_content: str, conversation: dict | None = None
+) -> str:
+    formatted_history, system_prompt, retrieval, metadata, persist_task = await _prepare_turn(
+        conversation_id, agent, user_content, conversation
+    )
+    response = await langgraph_agent.invoke_agent(
+        user_content, system_prompt=system_prompt, history=formatted_history, retrieval=retrieval
+    )
+    await persist_task
     await append_message(
         conversation_id,
         "assistant",
         response["content"],
+        metadata=metadata,
         rag_used=response["rag_used"],
         rag_docs_count=response["rag_docs_count"],
     )
+    summaries.schedule(conversation_id, (conversation or {}).get("summary"))
     return response["content"]
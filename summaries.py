@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import history
+import llm
+import repositories
+from prompt_templates import CONVERSATION_SUMMARY_SYSTEM_PROMPT, PromptTemplates
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Older turns are folded into a running summary stored on the conversation document once the messages after the
+# last summary exceed SUMMARY_TRIGGER_TOKENS; the newest SUMMARY_TAIL_TOKENS worth stay verbatim.
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "3000"))
+SUMMARY_TAIL_TOKENS = int(os.getenv("SUMMARY_TAIL_TOKENS", "1500"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "800"))
+# Bounds one compaction; a longer backlog is caught up over the following turns.
+SUMMARY_BATCH_MESSAGES = 200
+# Characters of each message shown to the summarizer, so a pasted log can't blow up the summary prompt.
+SUMMARY_MESSAGE_CHARS = 4000
+
+_running: dict[str, asyncio.Task] = {}
+
+
+def split_for_summary(messages: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Split oldest-first messages into (to summarize, tail kept verbatim) once they pass the trigger."""
+    total = sum(history.message_tokens(message) for message in messages)
+    if total < SUMMARY_TRIGGER_TOKENS:
+        return [], messages
+    cut = len(messages)
+    tail_tokens = 0
+    while cut > 0:
+        tail_tokens += history.message_tokens(messages[cut - 1])
+        if tail_tokens > SUMMARY_TAIL_TOKENS:
+            break
+        cut -= 1
+    return messages[:cut], messages[cut:]
+
+
+async def compact(conversation_id: str, summary: dict | None) -> dict | None:
+    """Fold the messages since ``summary`` (except the recent tail) into a new summary and store it.
+
+    Returns the stored summary, or None when there was nothing to do or another worker got there first.
+    """
+    after = summary.get("last_message_at") if summary else None
+    messages = await repositories.list_messages_after(conversation_id, after=after, limit=SUMMARY_BATCH_MESSAGES)
+    older, _ = split_for_summary(messages)
+    if not older:
+        return None
+
+    clipped = [{**message, "content": (message.get("content") or "")[:SUMMARY_MESSAGE_CHARS]} for message in older]
+    prompt = PromptTemplates.get_conversation_summary_prompt(summary.get("text") if summary else None, clipped)
+    text = await llm.get_response_text(
+        prompt, system_prompt=CONVERSATION_SUMMARY_SYSTEM_PROMPT, max_tokens=SUMMARY_MAX_TOKENS
+    )
+    text = text.strip()
+    if not text:
+        return None
+
+    last = older[-1]
+    new_summary = {
+        "text": text,
+        "tokens": history.count_tokens(text),
+        "last_message_id": last["id"],
+        "last_message_at": last["created_at"],
+        "messages": (summary.get("messages", 0) if summary else 0) + len(older),
+        "updated_at": datetime.now(timezone.utc),
+    }
+    previous_id = summary.get("last_message_id") if summary else None
+    if not await repositories.update_conversation_summary(conversation_id, new_summary, previous_id):
+        return None
+    return new_summary
+
+
+def schedule(conversation_id: str, summary: dict | None) -> None:
+    """Run compaction in the background after a reply; at most one per conversation per worker at a time."""
+    if not SUMMARY_ENABLED or conversation_id in _running:
+        return
+    task = asyncio.create_task(_compact_logged(conversation_id, summary))
+    _running[conversation_id] = task
+    task.add_done_callback(lambda _: _running.pop(conversation_id, None))
+
+
+async def _compact_logged(conversation_id: str, summary: dict | None) -> None:
+    try:
+        await compact(conversation_id, summary)
+    except Exception:
+        logger.warning("Failed to summarize conversation %s", conversation_id, exc_info=True)
+
+
+async def stop() -> None:
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+import pytest
+
+# Set before any app module is imported: they read their configuration at import time.
+os.environ.update(
+    CACHE_BACKEND="memory",
+    VECTOR_STORE="local",
+    EMBEDDING_PROVIDER="local",
+    LEXICAL_INDEX="true",
+    LOCAL_INDEX_DIR=tempfile.mkdtemp(prefix="test-vector-index-"),
+    LEXICAL_INDEX_DIR=tempfile.mkdtemp(prefix="test-lexical-index-"),
+)
+os.environ.setdefault("NVIDIA_API_KEY", "test")
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:1/?serverSelectionTimeoutMS=200")
+
+
+@pytest.fixture(autouse=True)
+def _isolated_indexes(tmp_path, monkeypatch):
+    """Give every test empty vector and lexical stores of its own."""
+    import lexical_index
+    import pinecone_service
+    import vector_store
+
+    monkeypatch.setattr(pinecone_service, "_store", vector_store.LocalIndexStore(str(tmp_path / "vector_index")))
+    monkeypatch.setattr(pinecone_service, "_lexical", lexical_index.LexicalStore(str(tmp_path / "lexical_index")))
+
+
+@pytest.fixture
+def write_pdf():
+    return _write_pdf
+
+
+def _write_pdf(path, page_count):
+    # Minimal PDF with one line of Helvetica text per page.
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i in range(page_count):
+        stream = f"BT /F1 12 Tf 72 720 Td (Page number {i}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
@@ -0,0 +1,30 @@
+import asyncio
+
+import chunk_store
+import rag
+import repositories
+
+
+def test_rag_fills_missing_text_from_chunk_store(monkeypatch):
+    stored = {"a": "alpha text", "b": "beta text"}
+    lookups = []
+
+    async def get_chunk_texts(ids):
+        lookups.append(list(ids))
+        return {i: stored[i] for i in ids if i in stored}
+
+    monkeypatch.setattr(repositories, "get_chunk_texts", get_chunk_texts)
+    chunk_store._local.clear()
+
+    results = [
+        {"id": "a", "text": "", "score": 0.9, "metadata": {}},
+        {"id": "legacy", "text": "inline text", "score": 0.8, "metadata": {}},
+        {"id": "gone", "text": "", "score": 0.7, "metadata": {}},
+    ]
+    filled = asyncio.run(rag._attach_text(results))
+
+    assert [(r["id"], r["text"]) for r in filled] == [("a", "alpha text"), ("legacy", "inline text")]
+    assert lookups == [["a", "gone"]]
+
+    asyncio.run(chunk_store.get_many(["a", "b"]))
+    assert lookups[-1] == ["b"]
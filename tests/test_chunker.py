@@ -0,0 +1,45 @@
+import tokens
+from chunker import Chunker, ChunkStream
+
+TEXT = "\n\n".join(f"Paragraph {i}. " + "\n".join("word " * (j % 30 + 5) for j in range(i % 4 + 1)) for i in range(300))
+
+
+def test_chunks_respect_size_and_offsets():
+    chunks = Chunker(chunk_size=500, chunk_overlap=100).split(TEXT)
+
+    assert len(chunks) > 10
+    for chunk in chunks:
+        assert 0 < len(chunk.text) <= 500
+        assert TEXT[chunk.start : chunk.end] == chunk.text
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start
+        assert current.start >= previous.end - 100
+    assert chunks[-1].end == len(TEXT.rstrip())
+
+
+def test_long_words_are_hard_cut_with_overlap():
+    chunks = Chunker(chunk_size=100, chunk_overlap=20).split("x" * 450)
+
+    assert [chunk.start for chunk in chunks] == [0, 80, 160, 240, 320, 400]
+    assert [len(chunk.text) for chunk in chunks] == [100, 100, 100, 100, 100, 50]
+
+
+def test_token_unit_bounds_estimated_tokens():
+    chunks = Chunker(chunk_size=120, chunk_overlap=20, unit="tokens").split(TEXT)
+
+    assert max(tokens.estimate_tokens(chunk.text) for chunk in chunks) <= 120
+
+
+def test_stream_matches_whole_text_and_tracks_pages():
+    chunker = Chunker(chunk_size=400, chunk_overlap=80)
+    pages = [TEXT[i : i + 3000] for i in range(0, len(TEXT), 3000)]
+    stream = ChunkStream(chunker, window_chars=2048)
+    results = []
+    for number, page in enumerate(pages, start=1):
+        results.extend(stream.feed(page, page=number))
+    results.extend(stream.finish())
+
+    assert [chunk for chunk, _, _ in results] == chunker.split(TEXT)
+    for chunk, page_start, page_end in results:
+        assert page_start == chunk.start // 3000 + 1
+        assert page_end == (chunk.end - 1) // 3000 + 1
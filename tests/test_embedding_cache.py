@@ -0,0 +1,49 @@
+import asyncio
+
+import embedding_cache
+import redis_cache
+from local_cache import LRUCache
+
+
+def _fresh_caches(monkeypatch):
+    monkeypatch.setattr(redis_cache, "backend", redis_cache.MemoryBackend())
+    monkeypatch.setattr(embedding_cache, "_local", LRUCache(max_entries=100))
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_SHARED", True)
+
+
+def _counting_embedder(calls):
+    async def embed_query(text):
+        calls.append(text)
+        return [1.0, float(len(text))]
+
+    return embed_query
+
+
+def test_repeated_query_is_served_from_the_local_cache(monkeypatch):
+    _fresh_caches(monkeypatch)
+    calls = []
+
+    async def scenario():
+        first = await embedding_cache.get_query_embedding("Reset  the Router", "m", _counting_embedder(calls))
+        second = await embedding_cache.get_query_embedding("reset the router", "m", _counting_embedder(calls))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == [1.0, 16.0]
+    assert calls == ["reset the router"]
+
+
+def test_other_workers_reuse_the_shared_tier(monkeypatch):
+    _fresh_caches(monkeypatch)
+    calls = []
+
+    async def scenario():
+        await embedding_cache.get_query_embedding("payment terms", "m", _counting_embedder(calls))
+        await asyncio.gather(*embedding_cache._shared_writes)
+        # A second worker starts with an empty in-process cache.
+        monkeypatch.setattr(embedding_cache, "_local", LRUCache(max_entries=100))
+        return await embedding_cache.get_query_embedding("payment terms", "m", _counting_embedder(calls))
+
+    assert asyncio.run(scenario()) == [1.0, 13.0]
+    assert calls == ["payment terms"]
+    assert embedding_cache._local.stats()["entries"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+
+from embedding_batcher import EmbeddingBatcher
+from embeddings import HashingEmbeddingProvider, PineconeEmbeddingProvider
+
+
+def test_hashing_embeddings_are_deterministic_and_unit_length():
+    provider = HashingEmbeddingProvider(dimension=256, workers=1)
+    first = provider.embed_query("Reset the router password")
+    second = asyncio.run(provider.aembed_documents(["Reset the router password"]))[0]
+    assert first == second
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+
+def test_hashing_embeddings_rank_lexical_overlap_higher():
+    provider = HashingEmbeddingProvider(dimension=256, workers=1)
+    query, related, unrelated = provider.embed_documents(
+        ["invoice payment terms", "payment terms for invoices", "concrete curing time"]
+    )
+    assert np.dot(query, related) > np.dot(query, unrelated)
+
+
+def test_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    async def embed_many(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    async def scenario():
+        batcher = EmbeddingBatcher(embed_many, window_ms=5, max_batch_size=8)
+        return await asyncio.gather(*[batcher.embed(text) for text in ["a", "bb", "a"]])
+
+    assert asyncio.run(scenario()) == [[1.0], [2.0], [1.0]]
+    assert calls == [["a", "bb"]]
+
+
+def test_cancelled_batch_releases_its_callers():
+    started = asyncio.Event()
+
+    async def embed_many(texts):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def scenario():
+        batcher = EmbeddingBatcher(embed_many, window_ms=0)
+        callers = [asyncio.ensure_future(batcher.embed(text)) for text in ["a", "b"]]
+        await started.wait()
+        for task in batcher._tasks:
+            task.cancel()
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+def test_pinecone_query_embeddings_use_one_query_request():
+    calls = []
+
+    class FakeInference:
+        def embed(self, model, inputs, parameters=None):
+            calls.append((model, inputs, parameters))
+            return [{"values": [float(len(text))]} for text in inputs]
+
+    # The constructor validates the model against the Pinecone API, so build the provider without it.
+    provider = object.__new__(PineconeEmbeddingProvider)
+    provider._inference = FakeInference()
+
+    assert provider.embed_queries(["ab", "abc"]) == [[2.0], [3.0]]
+    assert calls == [(provider.model, ["ab", "abc"], {"input_type": "query", "truncate": "END"})]
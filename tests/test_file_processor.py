@@ -0,0 +1,38 @@
+import asyncio
+import io
+
+import file_processor
+
+
+def test_parallel_pdf_extraction_keeps_page_order(tmp_path, monkeypatch, write_pdf):
+    path = tmp_path / "doc.pdf"
+    write_pdf(path, 10)
+
+    async def collect():
+        return [doc async for doc in file_processor.aiter_documents(str(path), "doc.pdf", on_page=pages.append)]
+
+    monkeypatch.setattr(file_processor, "PDF_EXTRACT_WORKERS", 1)
+    pages = []
+    expected = asyncio.run(collect())
+
+    monkeypatch.setattr(file_processor, "PDF_EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(file_processor, "PDF_PAGES_PER_TASK", 3)
+    monkeypatch.setattr(file_processor, "PDF_PARALLEL_MIN_PAGES", 1)
+    pages = []
+    try:
+        documents = asyncio.run(collect())
+    finally:
+        file_processor.close()
+
+    assert "Page number 9" in documents[-1].page_content
+    assert [(doc.page_content, doc.metadata) for doc in documents] == [
+        (doc.page_content, doc.metadata) for doc in expected
+    ]
+    assert documents[0].metadata["page_start"] == 1 and documents[-1].metadata["page_end"] == 10
+    assert sorted(pages) == [1, 3, 3, 3]
+
+
+def test_incremental_decoding_handles_split_characters():
+    data = ("héllo wörld " * 1000).encode("utf-8")
+    blocks = list(file_processor.iter_text_blocks(io.BytesIO(data), block_size=7))
+    assert "".join(blocks) == data.decode("utf-8")
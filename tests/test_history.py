@@ -0,0 +1,34 @@
+import history
+import llm
+
+
+def _message(role, content, **metadata):
+    return {"role": role, "content": content, "metadata": metadata}
+
+
+def test_fit_history_fills_the_budget_newest_first():
+    messages = [
+        _message("user", "old question", tokens=10),
+        _message("assistant", "a pasted log " * 500),
+        _message("user", "recent question", tokens=6),
+        _message("system", "ignored", tokens=1),
+        _message("assistant", "recent answer", tokens=6),
+    ]
+    selected, used = history.fit_history(messages, budget=40)
+
+    assert selected == [
+        {"role": "user", "content": "recent question"},
+        {"role": "assistant", "content": "recent answer"},
+    ]
+    assert used == 12 + 2 * history.MESSAGE_TOKEN_OVERHEAD
+    # The oversized message was counted once and its count kept on the message.
+    assert messages[1]["metadata"]["tokens"] > 1000
+
+
+def test_available_tokens_respects_agent_budget_and_model_window(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_CONTEXT_WINDOW", llm.MAX_TOKENS + 1000)
+    assert history.available_tokens({"history_token_budget": 500}, reserved_tokens=100) == 500
+    assert history.available_tokens({"history_token_budget": 5000}, reserved_tokens=100) == 1000 - 100 - 4
+    assert history.available_tokens(None, reserved_tokens=5000) == 0
+    # 0 means the agent gets no history, not the default budget.
+    assert history.available_tokens({"history_token_budget": 0}, reserved_tokens=100) == 0
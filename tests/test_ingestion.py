@@ -0,0 +1,108 @@
+import asyncio
+
+import ingestion
+
+
+def test_chunk_id_ignores_whitespace_but_not_model():
+    assert ingestion.chunk_id("hello  world\n", "m1") == ingestion.chunk_id("hello world", "m1")
+    assert ingestion.chunk_id("hello world", "m1") != ingestion.chunk_id("hello world", "m2")
+    assert ingestion.chunk_id("Hello world", "m1") != ingestion.chunk_id("hello world", "m1")
+
+
+def test_pipeline_skips_registered_and_repeated_chunks():
+    texts = ["alpha", "beta", "gamma", "beta", "delta"]
+    documents = [{"id": ingestion.chunk_id(text, "m"), "text": text, "metadata": {}} for text in texts]
+    registry = {documents[0]["id"]}
+    embedded, upserted = [], []
+
+    async def embed(batch):
+        embedded.extend(batch)
+        return [[1.0, 0.0] for _ in batch]
+
+    async def upsert(vectors):
+        upserted.extend(v["id"] for v in vectors)
+
+    async def existing(ids):
+        return registry & set(ids)
+
+    async def register(batch):
+        registry.update(doc["id"] for doc in batch)
+
+    report = asyncio.run(ingestion.run_pipeline(documents, embed, upsert, existing=existing, register=register))
+
+    assert sorted(embedded) == ["beta", "delta", "gamma"]
+    assert report["chunks"] == 5
+    assert report["skipped"] == 2
+    assert registry == {doc["id"] for doc in documents}
+
+    embedded.clear()
+    report = asyncio.run(ingestion.run_pipeline(documents, embed, upsert, existing=existing, register=register))
+    assert embedded == []
+    assert report["skipped"] == 5
+
+
+def test_replace_source_embeds_changes_and_deletes_removed(monkeypatch):
+    import pinecone_service
+    import repositories
+
+    registry: dict[str, set[str]] = {}
+    deleted, embedded = [], []
+
+    async def find_registered_chunks(store, namespace, ids):
+        return {i for i in ids if i in registry}
+
+    async def register_chunks(store, namespace, chunks):
+        for chunk in chunks:
+            registry.setdefault(chunk["id"], set()).add(chunk["source"])
+
+    async def list_source_chunks(store, namespace, source):
+        return {i for i, sources in registry.items() if source in sources}
+
+    async def release_source_chunks(store, namespace, source, ids):
+        for i in ids:
+            registry[i].discard(source)
+        orphaned = [i for i in ids if not registry[i]]
+        for i in orphaned:
+            del registry[i]
+        return orphaned
+
+    async def delete_vectors(ids, namespace=""):
+        deleted.extend(ids)
+
+    async def refresh_document_source(store, namespace, source):
+        return None
+
+    async def save_chunk_texts(texts):
+        return None
+
+    async def embed(texts):
+        embedded.extend(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+    for fn in (
+        find_registered_chunks,
+        register_chunks,
+        list_source_chunks,
+        release_source_chunks,
+        refresh_document_source,
+        save_chunk_texts,
+    ):
+        monkeypatch.setattr(repositories, fn.__name__, fn)
+    monkeypatch.setattr(pinecone_service, "_delete_vectors", delete_vectors)
+    monkeypatch.setattr(pinecone_service._provider, "aembed_documents", embed)
+    monkeypatch.setattr(pinecone_service._store, "upsert", lambda vectors, namespace="": None)
+
+    def version(texts):
+        return [
+            {"id": pinecone_service.chunk_id(text), "text": text, "metadata": {"source": "manual.txt"}}
+            for text in texts
+        ]
+
+    asyncio.run(pinecone_service.replace_source(version(["intro", "policy a", "policy b"]), "manual.txt"))
+    embedded.clear()
+    report = asyncio.run(pinecone_service.replace_source(version(["intro", "policy a v2", "policy b"]), "manual.txt"))
+
+    assert embedded == ["policy a v2"]
+    assert report["skipped"] == 2
+    assert report["removed"] == 1
+    assert deleted == [pinecone_service.chunk_id("policy a")]
@@ -0,0 +1,96 @@
+import asyncio
+import io
+
+import ingestion_jobs
+import pinecone_service
+import repositories
+
+
+def test_run_job_records_progress_and_result(tmp_path, monkeypatch):
+    updates = []
+
+    async def fake_update(job_id, fields):
+        updates.append((job_id, fields))
+
+    async def fake_add_documents(documents, namespace="", on_progress=None):
+        documents = [doc async for doc in documents]
+        await on_progress("chunks_embedded", len(documents))
+        await on_progress("vectors_upserted", len(documents))
+        return {"chunks": len(documents)}
+
+    monkeypatch.setattr(repositories, "update_ingestion_job", fake_update)
+    monkeypatch.setattr(pinecone_service, "add_documents", fake_add_documents)
+
+    path = tmp_path / "notes.txt"
+    ingestion_jobs._save_upload(io.BytesIO(b"hello world " * 200), str(path))
+    asyncio.run(ingestion_jobs.run_job({"id": "job1", "filename": "notes.txt", "path": str(path)}))
+
+    job_id, fields = updates[-1]
+    assert job_id == "job1"
+    assert fields["status"] == "succeeded"
+    chunks = fields["result"]["chunks"]
+    assert chunks > 1
+    assert fields["progress"]["chunks_embedded"] == chunks
+    assert fields["progress"]["vectors_upserted"] == chunks
+    assert len(fields["result"]["ids"]) == chunks
+    assert not path.exists()
+
+
+def test_run_job_counts_parsed_pdf_pages(tmp_path, monkeypatch, write_pdf):
+    updates = []
+
+    async def fake_update(job_id, fields):
+        updates.append(fields)
+
+    async def fake_add_documents(documents, namespace="", on_progress=None):
+        return {"chunks": len([doc async for doc in documents])}
+
+    monkeypatch.setattr(repositories, "update_ingestion_job", fake_update)
+    monkeypatch.setattr(pinecone_service, "add_documents", fake_add_documents)
+
+    path = tmp_path / "manual.pdf"
+    write_pdf(path, 3)
+    asyncio.run(ingestion_jobs.run_job({"id": "job4", "filename": "manual.pdf", "path": str(path)}))
+
+    assert updates[-1]["status"] == "succeeded", updates[-1].get("error")
+    assert updates[-1]["progress"]["pages_parsed"] == 3
+
+
+def test_run_job_marks_failure(tmp_path, monkeypatch):
+    updates = []
+
+    async def fake_update(job_id, fields):
+        updates.append(fields)
+
+    monkeypatch.setattr(repositories, "update_ingestion_job", fake_update)
+
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"   ")
+    asyncio.run(ingestion_jobs.run_job({"id": "job2", "filename": "empty.txt", "path": str(path)}))
+
+    assert updates[-1]["status"] == "failed"
+    assert "No text content" in updates[-1]["error"]
+
+
+def test_worker_loop_claims_jobs_left_by_dead_workers(monkeypatch):
+    claims, ran = [], []
+
+    async def fake_claim(worker_id, stale_seconds):
+        claims.append(stale_seconds)
+        return {"id": "job3", "attempts": 2} if len(claims) == 1 else None
+
+    async def fake_run_job(job):
+        ran.append(job["id"])
+
+    monkeypatch.setattr(repositories, "claim_ingestion_job", fake_claim)
+    monkeypatch.setattr(ingestion_jobs, "run_job", fake_run_job)
+    monkeypatch.setattr(ingestion_jobs, "INGEST_POLL_INTERVAL", 0.01)
+
+    async def main():
+        worker = asyncio.create_task(ingestion_jobs._worker_loop("w1"))
+        await asyncio.sleep(0.05)
+        worker.cancel()
+
+    asyncio.run(main())
+    assert ran == ["job3"]
+    assert len(claims) > 1 and set(claims) == {ingestion_jobs.INGEST_JOB_STALE_SECONDS}
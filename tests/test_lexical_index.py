@@ -0,0 +1,78 @@
+import threading
+
+from lexical_index import LexicalIndex, LexicalStore, identifier_terms, tokenize
+
+
+def _index(path=None):
+    index = LexicalIndex(path)
+    index.add(
+        ["a", "b", "c"],
+        [
+            "Replace valve AB-1234 before winter; the gasket kit is sold separately.",
+            "Winter maintenance: drain the outdoor lines and inspect every valve.",
+            "Expense policy HR-7 covers travel meals up to the daily limit.",
+        ],
+        [{"source": "plumbing.pdf"}, {"source": "plumbing.pdf"}, {"source": "policy.txt", "agent_scopes": ["finance"]}],
+        save=False,
+    )
+    return index
+
+
+def test_tokenize_keeps_codes_and_their_parts():
+    assert tokenize("Part AB-1234 is in the kit") == ["part", "ab-1234", "kit", "ab", "1234"]
+    assert identifier_terms("where is part AB-1234 and policy hr-7? see 2024") == ["ab-1234", "hr-7"]
+    assert identifier_terms("AB1234 torque") == ["ab1234"]
+    assert identifier_terms("What are the 401k limits for 2024?") == []
+    assert identifier_terms("Is a follow-up inspection required?") == []
+
+
+def test_bm25_ranks_and_filters():
+    index = _index()
+    assert [doc_id for doc_id, _, _ in index.search("valve winter", top_k=3)][:2] in (["a", "b"], ["b", "a"])
+    assert [doc_id for doc_id, _, _ in index.search("ab-1234", top_k=3)] == ["a"]
+    assert [doc_id for doc_id, _, _ in index.search("valve", required_terms=["ab-1234"])] == ["a"]
+    assert index.search("travel limit", filter={"agent_scopes": {"$in": ["finance"]}})[0][0] == "c"
+    assert index.search("travel limit", filter={"source": "plumbing.pdf"}) == []
+
+
+def test_incremental_delete_compaction_and_reload(tmp_path):
+    index = _index(str(tmp_path))
+    index.delete(["a", "b"])
+    assert index.search("valve") == []
+    assert index.stats()["deleted_rows"] == 0
+
+    index.add(["d"], ["New valve AB-1234 installed"])
+    reloaded = LexicalIndex(str(tmp_path))
+    assert len(reloaded) == 2
+    assert [doc_id for doc_id, _, _ in reloaded.search("AB-1234")] == ["d"]
+    assert reloaded.search("expense policy")[0][0] == "c"
+
+
+def test_writers_sharing_a_directory_keep_each_others_changes(tmp_path):
+    worker, api = LexicalStore(str(tmp_path)), LexicalStore(str(tmp_path))
+    api.add([{"id": "old", "text": "retired form QF-12"}])
+    api.flush()
+
+    worker.add([{"id": "new", "text": "replacement form ZX-99"}])
+    worker.flush()
+    api.delete(["old"])
+    api.flush()
+
+    for store in (worker, api, LexicalStore(str(tmp_path))):
+        assert [doc_id for doc_id, _, _ in store.search("zx-99", top_k=2)] == ["new"]
+        assert store.search("qf-12", top_k=2) == []
+
+
+def test_second_writer_waits_for_unsaved_changes(tmp_path):
+    first, second = LexicalIndex(str(tmp_path)), LexicalIndex(str(tmp_path))
+    first.add(["a"], ["valve AB-1234"], save=False)
+
+    writer = threading.Thread(target=second.add, args=(["b"], ["gasket CD-5678"]))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+
+    first.save()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert {doc_id for doc_id, _, _ in LexicalIndex(str(tmp_path)).search("ab-1234 cd-5678", top_k=2)} == {"a", "b"}
@@ -0,0 +1,25 @@
+import time
+
+from local_cache import LRUCache
+
+
+def test_evicts_least_recently_used_by_count_and_bytes():
+    cache = LRUCache(max_entries=2, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.get("a")
+    cache.set("c", "xxxx")
+    assert "b" not in cache
+    assert cache.get("a") == "xxxx"
+
+    cache.set("d", "xxxxxxxx")
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] == 8
+
+
+def test_entries_expire_after_ttl():
+    cache = LRUCache(max_entries=10, ttl=0.01)
+    cache.set("a", [1, 2])
+    assert cache.get("a") == [1, 2]
+    time.sleep(0.02)
+    assert cache.get("a") is None
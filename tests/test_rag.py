@@ -0,0 +1,81 @@
+import rag
+from vector_index import LocalVectorIndex
+
+
+def test_retrieval_options_scope_agents_to_their_chunks():
+    index = LocalVectorIndex()
+    index.upsert(
+        ["finance", "construction", "shared"],
+        [[1, 0], [1, 0.1], [1, 0.2]],
+        [{"agent_scopes": ["finance"]}, {"agent_scopes": ["construction"]}, {}],
+    )
+
+    options = rag.retrieval_options({"retrieval": {"namespace": "docs", "scopes": ["finance"], "top_k": 2}})
+    assert options["namespace"] == "docs" and options["top_k"] == 2
+    found = {doc_id for doc_id, _, _ in index.search([1, 0], top_k=3, filter=options["filter"])}
+    assert found == {"finance", "shared"}
+
+    strict = rag.retrieval_options({"retrieval": {"scopes": ["finance"], "include_unscoped": False}})
+    assert [doc_id for doc_id, _, _ in index.search([1, 0], top_k=3, filter=strict["filter"])] == ["finance"]
+
+    assert rag.retrieval_options({"name": "General"}) == {"namespace": ""}
+    assert rag.retrieval_options({"retrieval": {"enabled": False}})["include_context"] is False
+
+
+def _result(doc_id, text, score, **metadata):
+    return {"id": doc_id, "text": text, "score": score, "metadata": {"source": "a.txt", **metadata}}
+
+
+def test_merge_chunks_removes_overlap_using_offsets():
+    text = "alpha beta gamma delta epsilon zeta"
+    results = [
+        _result("2", text[11:29], 0.8, chunk_index=1, start_offset=11, end_offset=29, ingest_id="j1"),
+        _result("1", text[:16], 0.9, chunk_index=0, start_offset=0, end_offset=16, ingest_id="j1"),
+        _result("3", "other source", 0.5, source="b.txt", chunk_index=0, start_offset=0, end_offset=12),
+    ]
+    merged = rag.merge_chunks(results)
+
+    assert [doc.page_content for doc in merged] == [text[:29], "other source"]
+    assert merged[0].score == 0.9
+    assert merged[0].metadata["merged_chunks"] == 2 and merged[0].metadata["end_offset"] == 29
+
+
+def test_merge_chunks_without_offsets_matches_the_overlap_text():
+    first = "The foundation must cure for seven days before framing starts."
+    second = "seven days before framing starts. Inspect the anchors first."
+    merged = rag.merge_chunks([_result("1", first, 0.7, chunk_index=3), _result("2", second, 0.6, chunk_index=4)])
+
+    assert [doc.page_content for doc in merged] == [first + " Inspect the anchors first."]
+
+
+def test_merge_chunks_ignores_offsets_from_another_document_version():
+    # After a replace, a kept chunk still carries the offsets of the version it was first ingested from.
+    kept = _result("1", "Roofing is covered for ten years.", 0.8, chunk_index=2, ingest_id="old")
+    kept["metadata"].update(start_offset=1600, end_offset=2600)
+    new = _result("2", "File claims within 30 days.", 0.7, chunk_index=3, ingest_id="new")
+    new["metadata"].update(start_offset=1700, end_offset=2200)
+    merged = rag.merge_chunks([kept, new])
+
+    assert [doc.page_content for doc in merged] == [kept["text"] + "\n" + new["text"]]
+
+
+def test_selection_and_budget_limit_the_context():
+    results = [_result("1", "x" * 10, 0.9, chunk_index=0), _result("2", "y" * 10, 0.2, chunk_index=5)]
+    assert [r["id"] for r in rag.select_chunks(results)] == ["1"]
+    assert [r["id"] for r in rag.select_chunks(results, score_threshold=0.95)] == []
+
+    docs = [rag.Document("one two three four", score=0.9), rag.Document("five six", score=0.8)]
+    fitted = rag.fit_to_budget(docs, 12)
+    assert [doc.page_content for doc in fitted] == ["one two"]
+    assert fitted[0].metadata["truncated"] is True
+
+
+def test_reciprocal_rank_fusion_keeps_both_scores():
+    dense = [_result("1", "", 0.8), _result("2", "two", 0.7)]
+    lexical = [_result("2", "", 12.0), _result("3", "", 9.0)]
+    fused = rag.reciprocal_rank_fusion(dense, lexical, top_k=3)
+
+    assert [r["id"] for r in fused] == ["2", "1", "3"]
+    assert fused[0]["dense_score"] == 0.7 and fused[0]["lexical_score"] == 12.0 and fused[0]["text"] == "two"
+    assert fused[2]["dense_score"] is None
+    assert [r["id"] for r in rag.select_chunks(fused)] == ["2", "1", "3"]
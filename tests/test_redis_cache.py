@@ -0,0 +1,22 @@
+import asyncio
+
+import redis_cache
+
+
+def test_memory_backend_push_trims_and_orders_newest_first():
+    backend = redis_cache.MemoryBackend()
+    asyncio.run(backend.push_list("k", ["a", "b", "c"], limit=2, ttl=60))
+    assert asyncio.run(backend.get_list("k")) == ["c", "b"]
+
+
+def test_cache_messages_backfill_replaces_existing_list(monkeypatch):
+    monkeypatch.setattr(redis_cache, "backend", redis_cache.MemoryBackend())
+
+    async def scenario():
+        await redis_cache.cache_recent_message("c1", {"id": "stale", "content": "old"})
+        await redis_cache.cache_messages("c1", [{"id": "1"}, {"id": "2"}], replace=True)
+        await redis_cache.cache_recent_message("c1", {"id": "3"})
+        return await redis_cache.get_recent_messages("c1")
+
+    messages = asyncio.run(scenario())
+    assert [m["id"] for m in messages] == ["1", "2", "3"]
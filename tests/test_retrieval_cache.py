@@ -0,0 +1,52 @@
+import asyncio
+
+import redis_cache
+import retrieval_cache
+from local_cache import LRUCache
+
+
+def _fresh_caches(monkeypatch):
+    backend = redis_cache.MemoryBackend()
+    reads = []
+    get = backend.get
+
+    async def counting_get(key):
+        reads.append(key)
+        return await get(key)
+
+    monkeypatch.setattr(backend, "get", counting_get)
+    monkeypatch.setattr(redis_cache, "backend", backend)
+    monkeypatch.setattr(retrieval_cache, "_local", LRUCache(max_entries=100))
+    monkeypatch.setattr(retrieval_cache, "_versions", LRUCache(max_entries=100, ttl=60))
+    return backend, reads
+
+
+def test_cache_hits_do_not_read_the_corpus_version_again(monkeypatch):
+    _, reads = _fresh_caches(monkeypatch)
+
+    async def scenario():
+        version = await retrieval_cache.get_corpus_version("docs")
+        retrieval_cache.put("Payment terms", 4, "docs", version, [{"id": "a"}])
+        version = await retrieval_cache.get_corpus_version("docs")
+        return retrieval_cache.get("payment  terms", 4, "docs", version)
+
+    assert asyncio.run(scenario()) == [{"id": "a"}]
+    assert len(reads) == 1
+
+
+def test_bumping_the_corpus_version_invalidates_cached_results(monkeypatch):
+    backend, _ = _fresh_caches(monkeypatch)
+
+    async def scenario():
+        version = await retrieval_cache.get_corpus_version("docs")
+        retrieval_cache.put("payment terms", 4, "docs", version, [{"id": "a"}])
+        await retrieval_cache.bump_corpus_version("docs")
+        local = retrieval_cache.get("payment terms", 4, "docs", await retrieval_cache.get_corpus_version("docs"))
+
+        # Another worker's bump is seen once this worker's copy of the version expires.
+        await backend.incr(retrieval_cache._version_key("docs"))
+        stale = await retrieval_cache.get_corpus_version("docs")
+        retrieval_cache._versions.clear()
+        return local, stale, await retrieval_cache.get_corpus_version("docs")
+
+    assert asyncio.run(scenario()) == (None, 1, 2)
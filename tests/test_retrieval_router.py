@@ -0,0 +1,64 @@
+import asyncio
+
+import langgraph_agent
+import retrieval_router
+
+
+def test_route_skips_conversational_turns():
+    for prompt in (
+        "thanks!",
+        "hi there",
+        "cool, thanks a lot",
+        "make it shorter",
+        "Can you rephrase that?",
+        "lol",
+        "haha nice one",
+        "yes please",
+        "no worries",
+        "i see",
+    ):
+        assert not retrieval_router.route(prompt).retrieve, prompt
+    for prompt in ("translate that into Spanish", "put it in a table please", "try again"):
+        assert retrieval_router.route(prompt).reason == "follow_up", prompt
+    for prompt in (
+        "What is the load capacity of a steel beam?",
+        "make a list of the permit requirements for a deck",
+        "Tell me about Roth IRA limits",
+        "Can you summarize the warranty policy in that document?",
+        "Translate the OSHA fall protection rules for this site into Spanish",
+        "put together the permit checklist for this deck",
+        "OSHA",
+        "scaffolding",
+        "deductible",
+        "roth ira",
+        "Paris",
+        "great, and for decks?",
+        "tax",
+    ):
+        assert retrieval_router.route(prompt).retrieve, prompt
+
+
+def test_route_follows_agent_policy():
+    assert retrieval_router.route("thanks", {"retrieval": {"route": "always"}}).retrieve
+    assert not retrieval_router.route("What is a lien?", {"retrieval": {"enabled": False}}).retrieve
+    assert retrieval_router.route("ok nice", {"retrieval": {"route_threshold": -5}}).reason == "smalltalk"
+
+
+def test_routed_retrieve_records_the_decision(monkeypatch):
+    calls = []
+
+    async def fake_retrieve(prompt, agent=None):
+        calls.append(prompt)
+        return "context", ["doc"]
+
+    monkeypatch.setattr(langgraph_agent, "retrieve", fake_retrieve)
+
+    retrieval, route = asyncio.run(langgraph_agent.routed_retrieve("How do I budget for a renovation?"))
+    assert retrieval == ("context", ["doc"])
+    assert route["retrieve"] and route["reason"] == "classifier" and "retrieval_ms" in route
+
+    retrieval, route = asyncio.run(langgraph_agent.routed_retrieve("thank you!"))
+    assert retrieval == ("", [])
+    assert route == {"retrieve": False, "reason": "smalltalk", "saved_ms": route["saved_ms"]}
+    assert route["saved_ms"] is not None
+    assert calls == ["How do I budget for a renovation?"]
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+import langgraph_agent
+import services
+
+
+def test_failed_turn_does_not_store_the_user_message(monkeypatch):
+    stored = []
+
+    async def slow_history(conversation_id, limit=None):
+        await asyncio.sleep(0.05)
+        return []
+
+    async def failing_retrieve(prompt, agent=None):
+        raise RuntimeError("vector store down")
+
+    async def fake_append(conversation_id, role, content, metadata=None):
+        stored.append((role, content))
+
+    monkeypatch.setattr(services, "list_messages", slow_history)
+    monkeypatch.setattr(langgraph_agent, "routed_retrieve", failing_retrieve)
+    monkeypatch.setattr(services, "append_message", fake_append)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await services._prepare_turn("c1", {}, "hello", {"_id": "c1"})
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert stored == []
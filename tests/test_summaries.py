@@ -0,0 +1,56 @@
+import asyncio
+
+import history
+import llm
+import repositories
+import summaries
+
+
+def _message(i, role, tokens):
+    return {"id": f"m{i}", "role": role, "content": f"message {i}", "created_at": i, "metadata": {"tokens": tokens}}
+
+
+def test_split_keeps_the_recent_tail(monkeypatch):
+    monkeypatch.setattr(summaries, "SUMMARY_TRIGGER_TOKENS", 100)
+    monkeypatch.setattr(summaries, "SUMMARY_TAIL_TOKENS", 50)
+    messages = [_message(i, "user" if i % 2 == 0 else "assistant", 30) for i in range(5)]
+
+    older, tail = summaries.split_for_summary(messages)
+    assert [m["id"] for m in older] == ["m0", "m1", "m2", "m3"]
+    assert [m["id"] for m in tail] == ["m4"]
+    assert summaries.split_for_summary(messages[:3]) == ([], messages[:3])
+
+
+def test_compact_stores_a_rolling_summary(monkeypatch):
+    monkeypatch.setattr(summaries, "SUMMARY_TRIGGER_TOKENS", 100)
+    monkeypatch.setattr(summaries, "SUMMARY_TAIL_TOKENS", 50)
+    messages = [_message(i, "user" if i % 2 == 0 else "assistant", 30) for i in range(3, 8)]
+    stored = {}
+
+    async def list_messages_after(conversation_id, after=None, limit=200):
+        assert after == 2
+        return messages
+
+    async def get_response_text(prompt, system_prompt=None, history=None, max_tokens=None):
+        assert "earlier summary" in prompt and "message 6" in prompt and "message 7" not in prompt
+        return " updated summary "
+
+    async def update_conversation_summary(conversation_id, summary, previous_message_id):
+        stored.update(summary, previous=previous_message_id)
+        return True
+
+    monkeypatch.setattr(repositories, "list_messages_after", list_messages_after)
+    monkeypatch.setattr(repositories, "update_conversation_summary", update_conversation_summary)
+    monkeypatch.setattr(llm, "get_response_text", get_response_text)
+
+    previous = {"text": "earlier summary", "last_message_id": "m2", "last_message_at": 2, "messages": 3}
+    summary = asyncio.run(summaries.compact("c1", previous))
+
+    assert summary["text"] == "updated summary"
+    assert summary["last_message_id"] == "m6" and summary["messages"] == 7
+    assert stored["previous"] == "m2"
+
+    # Later turns send the summary in the system prompt and only the messages after it.
+    window = [_message(i, "user" if i % 2 == 0 else "assistant", 30) for i in range(0, 8)]
+    assert [m["id"] for m in history.after_summary(window, summary)] == ["m7"]
+    assert history.with_summary("You are helpful.", summary).endswith("earlier conversation:\nupdated summary")
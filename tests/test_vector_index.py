@@ -0,0 +1,104 @@
+import numpy as np
+
+from vector_index import LocalVectorIndex
+from vector_store import LocalIndexStore
+
+
+def test_flat_search_ranks_by_cosine_and_applies_filters():
+    index = LocalVectorIndex()
+    index.upsert(
+        ["a", "b", "c"],
+        [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0]],
+        [{"source": "x"}, {"source": "y"}, {"source": "x"}],
+    )
+    assert [doc_id for doc_id, _, _ in index.search([1, 0, 0], top_k=2)] == ["a", "b"]
+    assert [doc_id for doc_id, _, _ in index.search([1, 0, 0], top_k=2, filter={"source": "y"})] == ["b"]
+
+
+def test_delete_and_reload_from_disk(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.upsert(["a", "b", "c"], [[1, 0], [0, 1], [1, 1]], [{"n": 1}, {"n": 2}, {"n": 3}])
+    index.delete(["a"])
+
+    reloaded = LocalVectorIndex(str(tmp_path))
+    assert len(reloaded) == 2
+    assert reloaded.search([1, 0.1], top_k=1)[0][0] == "c"
+    assert reloaded.get_metadata("b") == {"n": 2}
+
+
+def test_ivf_mode_finds_exact_match():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+    index = LocalVectorIndex(ivf_min_vectors=1000, nprobe=8)
+    index.upsert([str(i) for i in range(len(vectors))], vectors)
+
+    assert index.stats()["mode"] == "ivf"
+    assert index.search(vectors[42], top_k=1)[0][0] == "42"
+
+
+def test_flushing_an_empty_namespace_does_not_break_startup(tmp_path):
+    store = LocalIndexStore(str(tmp_path))
+    store.delete(["x"], "finance")
+    store.flush("finance")
+
+    reopened = LocalIndexStore(str(tmp_path))
+    reopened.ensure(2)
+    assert reopened.query([1, 0], top_k=1, namespace="finance") == []
+
+
+def test_metadata_without_vectors_file_loads_as_empty(tmp_path):
+    # Left behind by versions that saved a namespace before its first upsert.
+    (tmp_path / "meta.json").write_text('{"dimension": null, "size": 0, "ids": [], "metadata": []}')
+    index = LocalVectorIndex(str(tmp_path))
+    assert len(index) == 0
+    index.upsert(["a"], [[1, 0]])
+    assert LocalVectorIndex(str(tmp_path)).search([1, 0], top_k=1)[0][0] == "a"
+
+
+def test_writers_sharing_a_directory_keep_each_others_changes(tmp_path):
+    worker, api = LocalIndexStore(str(tmp_path)), LocalIndexStore(str(tmp_path))
+    api.upsert([{"id": "old", "values": [0, 1]}])
+    api.flush()
+
+    worker.upsert([{"id": "new", "values": [1, 0]}])
+    worker.flush()
+    api.delete(["old"])
+    api.flush()
+
+    assert [match["id"] for match in LocalIndexStore(str(tmp_path)).query([1, 0], top_k=2)] == ["new"]
+
+
+def test_readers_see_only_saved_rows(tmp_path):
+    writer = LocalVectorIndex(str(tmp_path))
+    writer.upsert(["a", "b"], [[1, 0], [0, 1]])
+    reader = LocalVectorIndex(str(tmp_path))
+    assert not reader._vectors.flags.writeable
+
+    # Appended rows are picked up from the end of the log without reopening the index.
+    generation = reader._generation
+    writer.upsert(["c"], [[1, 1]])
+    reader.refresh()
+    assert reader._generation == generation
+    assert reader.get_metadata("c") == {}
+
+    writer.delete(["a"], save=False)
+    writer.upsert(["b", "d"], [[1, 0.1], [0.5, 1]], save=False)
+    reader.refresh()
+    assert [doc_id for doc_id, _, _ in reader.search([1, 0], top_k=3)] == ["a", "c", "b"]
+
+    writer.save()
+    reader.refresh()
+    assert [doc_id for doc_id, _, _ in reader.search([1, 0], top_k=3)] == ["b", "c", "d"]
+    assert len(reader) == 3
+
+
+def test_deleted_rows_are_compacted_away(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.upsert([str(i) for i in range(8)], np.eye(8))
+    index.delete([str(i) for i in range(4)])
+
+    assert index.stats()["deleted_rows"] == 0
+    reloaded = LocalVectorIndex(str(tmp_path))
+    assert len(reloaded) == 4
+    assert reloaded.search(np.eye(8)[5], top_k=1)[0][0] == "5"
+    assert sorted(path.name for path in tmp_path.iterdir() if path.name.startswith("vectors-")) == [index._vectors_file]
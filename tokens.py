@@ -0,0 +1,14 @@
+import re
+
+# Approximates BPE tokenizers without loading a vocabulary (tiktoken downloads its files on first use): each run
+# of up to 6 word characters and each punctuation mark counts as one token.
+TOKEN_PATTERN = re.compile(r"\w{1,6}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def token_starts(text: str) -> list[int]:
+    # Character offset of every estimated token, so token budgets can be mapped back onto the text.
+    return [m.start() for m in TOKEN_PATTERN.finditer(text)]
@@ -0,0 +1,579 @@
+import fcntl
+import json
+import os
+import threading
+from typing import Callable
+
+import numpy as np
+
+# Above this many vectors a search probes only the nearest inverted lists instead of scanning every row.
+IVF_MIN_VECTORS = int(os.getenv("LOCAL_INDEX_IVF_MIN_VECTORS", "50000"))
+IVF_NPROBE = int(os.getenv("LOCAL_INDEX_IVF_NPROBE", "16"))
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_SAMPLE = 100_000
+_BLOCK_ROWS = 65536
+
+# Tombstoned rows are dropped by rewriting the index once they make up this share of it.
+_COMPACT_RATIO = 0.25
+
+_STATE_FILE = "state.json"
+_LOCK_FILE = ".lock"
+# Single-file layout written by earlier versions; loaded once and rewritten in the current layout on first save.
+_LEGACY_VECTORS_FILE = "vectors.npy"
+_LEGACY_IVF_FILE = "ivf.npz"
+_LEGACY_META_FILE = "meta.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    # Subset of the Pinecone filter language: equality, $eq, $ne, $in, $nin, $exists, $and and $or.
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and expected not in values:
+                return False
+            if op == "$ne" and expected in values:
+                return False
+            if op == "$in" and not any(v in expected for v in values):
+                return False
+            if op == "$nin" and any(v in expected for v in values):
+                return False
+            if op == "$exists" and (field in metadata) != bool(expected):
+                return False
+    return True
+
+
+class WriterLock:
+    """Exclusive ``flock`` on an index directory, held from a process's first unsaved change until it saves.
+
+    Writers in other processes block until then, and ``acquire`` reloads the index once the lock is taken, so a
+    save never overwrites changes its process hasn't seen. Readers don't take it.
+    """
+
+    def __init__(self, path: str):
+        self._path = os.path.join(path, _LOCK_FILE)
+        self._fd: int | None = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, on_acquire: Callable[[], None]) -> None:
+        with self._thread_lock:
+            if self._fd is not None:
+                return
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                on_acquire()
+            except BaseException:
+                os.close(fd)
+                raise
+            self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def lock_for_write(lock: threading.RLock, writer: WriterLock | None, refresh: Callable[[], None]) -> None:
+    """Acquire ``lock`` and, if given, ``writer`` (reloading through ``refresh`` when it is newly taken).
+
+    The wait for another process's writer happens without ``lock``, so searches in this process carry on.
+    """
+    while True:
+        if writer is not None:
+            writer.acquire(refresh)
+        lock.acquire()
+        if writer is None or writer.held:
+            return
+        # Another thread saved (and released the writer lock) in between.
+        lock.release()
+
+
+class LocalVectorIndex:
+    """Cosine-similarity index over L2-normalized float32 vectors held in a NumPy matrix.
+
+    Small indexes are searched with one matrix-vector product. Once an index reaches ``ivf_min_vectors`` rows,
+    it trains spherical k-means centroids and searches only the ``nprobe`` nearest inverted lists.
+
+    With a ``path``, vectors live in a memory-mapped ``.npy`` file and ids and metadata in an append-only log;
+    ``state.json`` records how much of both is committed. Saved rows are never changed in place: deletes and
+    re-upserts tombstone the old row, and once tombstones reach ``_COMPACT_RATIO`` the live rows are rewritten
+    into a new generation of files. Readers map the vectors read-only and, in ``refresh``, read only the log
+    records added since their last look. Writers in several processes are serialized by a WriterLock.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        dimension: int | None = None,
+        ivf_min_vectors: int = IVF_MIN_VECTORS,
+        nprobe: int = IVF_NPROBE,
+    ):
+        self.path = path
+        self.dimension = dimension
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._writer = WriterLock(path) if path else None
+        self._reset()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self.load()
+
+    def _reset(self) -> None:
+        self._vectors = np.empty((0, self.dimension or 0), dtype=np.float32)
+        self._vectors_file: str | None = None
+        self._size = 0
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._metadata: list[dict] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._centroids: np.ndarray | None = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._assigned = 0
+        self._trained_size = 0
+        self._ivf_file: str | None = None
+        self._lists: tuple[np.ndarray, np.ndarray] | None = None
+        # None until the index has been written in the current layout (a new or legacy index).
+        self._generation: int | None = None
+        self._log_bytes = 0
+        self._pending_log: list[str] = []
+        self._loaded_key: tuple | None = None
+        self._dirty = False
+        self._ivf_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # -- mutation -------------------------------------------------------------------------------------------
+
+    def upsert(self, ids: list[str], vectors, metadatas: list[dict] | None = None, save: bool = True) -> None:
+        if not ids:
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        lock_for_write(self._lock, self._writer, self._refresh_for_write)
+        try:
+            if self.dimension is None:
+                self.dimension = matrix.shape[1]
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match index dimension {self.dimension}")
+
+            self._reserve(self._size + len(ids))
+            for i, doc_id in enumerate(ids):
+                self._tombstone(doc_id)
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._ids.append(doc_id)
+                metadata = dict(metadatas[i]) if metadatas else {}
+                self._metadata.append(metadata)
+                self._alive[row] = True
+                self._vectors[row] = matrix[i]
+                self._log({"i": doc_id, "m": metadata})
+
+            self._lists = None
+            self._dirty = True
+            self._maybe_train()
+            self._assign_rows()
+            if save:
+                self.save()
+        finally:
+            self._lock.release()
+
+    def delete(self, ids: list[str], save: bool = True) -> None:
+        lock_for_write(self._lock, self._writer, self._refresh_for_write)
+        try:
+            for doc_id in ids:
+                if self._tombstone(doc_id):
+                    self._lists = None
+                    self._dirty = True
+            if save:
+                self.save()
+        finally:
+            self._lock.release()
+
+    def _tombstone(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._log({"d": row})
+        return True
+
+    def _log(self, record: dict) -> None:
+        if self.path:
+            self._pending_log.append(json.dumps(record, separators=(",", ":")) + "\n")
+
+    # -- search ---------------------------------------------------------------------------------------------
+
+    def search(self, query, top_k: int = 4, filter: dict | None = None) -> list[tuple[str, float, dict]]:
+        q = _normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            live = len(self._rows)
+            if live == 0 or top_k <= 0:
+                return []
+            alive = self._alive[: self._size]
+            candidates = self._candidate_rows(q)
+            if candidates is not None:
+                candidates = candidates[alive[candidates]]
+            if filter:
+                if candidates is None:
+                    candidates = np.flatnonzero(alive)
+                keep = [row for row in candidates.tolist() if matches_filter(self._metadata[row], filter)]
+                candidates = np.asarray(keep, dtype=np.int64)
+            if candidates is not None and candidates.size == 0:
+                return []
+
+            if candidates is None:
+                scores = self._vectors[: self._size] @ q
+                if live < self._size:
+                    scores[~alive] = -np.inf
+                rows = None
+                k = min(top_k, live)
+            else:
+                scores = self._vectors[candidates] @ q
+                rows = candidates
+                k = min(top_k, scores.shape[0])
+
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results = []
+            for position in best.tolist():
+                row = position if rows is None else int(rows[position])
+                results.append((self._ids[row], float(scores[position]), self._metadata[row]))
+            return results
+
+    def get_metadata(self, doc_id: str) -> dict | None:
+        with self._lock:
+            row = self._rows.get(doc_id)
+            return self._metadata[row] if row is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "vectors": len(self._rows),
+            "dimension": self.dimension,
+            "mode": "ivf" if self._centroids is not None and len(self._rows) >= self.ivf_min_vectors else "flat",
+            "nlist": 0 if self._centroids is None else int(self._centroids.shape[0]),
+            "deleted_rows": self._size - len(self._rows),
+        }
+
+    # -- approximate search ---------------------------------------------------------------------------------
+
+    def _candidate_rows(self, q: np.ndarray) -> np.ndarray | None:
+        if self._centroids is None or len(self._rows) < self.ivf_min_vectors:
+            return None
+        if self._lists is None:
+            assign = self._assign[: self._size]
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=self._centroids.shape[0])
+            self._lists = (order, np.concatenate(([0], np.cumsum(counts))))
+        order, offsets = self._lists
+        probe = self._nearest_centroids(q.reshape(1, -1), min(self.nprobe, self._centroids.shape[0]))[0]
+        return np.concatenate([order[offsets[c] : offsets[c + 1]] for c in probe.tolist()])
+
+    def _nearest_centroids(self, vectors: np.ndarray, n: int) -> np.ndarray:
+        out = np.empty((vectors.shape[0], n), dtype=np.int32)
+        for start in range(0, vectors.shape[0], _BLOCK_ROWS):
+            sims = vectors[start : start + _BLOCK_ROWS] @ self._centroids.T
+            if n == 1:
+                out[start : start + _BLOCK_ROWS, 0] = np.argmax(sims, axis=1)
+            else:
+                top = np.argpartition(-sims, n - 1, axis=1)[:, :n]
+                out[start : start + _BLOCK_ROWS] = top
+        return out
+
+    def _assign_rows(self) -> None:
+        # Rows added since the centroids were trained (or loaded) go to their nearest list; writers and readers
+        # compute the same assignment, so only a retrain has to be saved.
+        if self._centroids is not None and self._assigned < self._size:
+            rows = slice(self._assigned, self._size)
+            self._assign[rows] = self._nearest_centroids(np.asarray(self._vectors[rows]), 1)[:, 0]
+            self._lists = None
+        self._assigned = self._size
+
+    def _maybe_train(self) -> None:
+        live = len(self._rows)
+        if live < self.ivf_min_vectors:
+            return
+        if self._centroids is not None and live < 2 * self._trained_size:
+            return
+        self._train()
+
+    def _train(self) -> None:
+        rng = np.random.default_rng(0)
+        live_rows = np.flatnonzero(self._alive[: self._size])
+        nlist = int(min(4096, max(16, 4 * np.sqrt(live_rows.size))))
+        sample_rows = rng.choice(live_rows, size=min(live_rows.size, IVF_TRAIN_SAMPLE), replace=False)
+        sample = np.asarray(self._vectors[np.sort(sample_rows)])
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        self._centroids = centroids
+        self._assign[: self._size] = self._nearest_centroids(self._vectors[: self._size], 1)[:, 0]
+        self._assigned = self._size
+        self._trained_size = live_rows.size
+        self._lists = None
+        self._ivf_dirty = True
+
+    # -- storage --------------------------------------------------------------------------------------------
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._vectors.shape[0]
+        if needed <= capacity and self._vectors.shape[1] == self.dimension:
+            return
+        new_capacity = max(1024, 2 * capacity, needed)
+        if self.path:
+            name = f"vectors-{self._generation or 0}-{new_capacity}.npy"
+            grown = np.lib.format.open_memmap(
+                os.path.join(self.path, name), mode="w+", dtype=np.float32, shape=(new_capacity, self.dimension)
+            )
+            self._vectors_file = name
+        else:
+            grown = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        if self._size:
+            grown[: self._size] = self._vectors[: self._size]
+        self._vectors = grown
+        self._grow_rows(new_capacity)
+
+    def _grow_rows(self, capacity: int) -> None:
+        if self._alive.shape[0] >= capacity:
+            return
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+        self._alive, self._assign = alive, assign
+
+    def _compact(self) -> None:
+        # Copy the live rows into a new generation of files; readers keep their mapping of the old ones.
+        keep = np.flatnonzero(self._alive[: self._size])
+        ids = [self._ids[row] for row in keep.tolist()]
+        metadata = [self._metadata[row] for row in keep.tolist()]
+        assign = self._assign[keep]
+        old_vectors = self._vectors
+        self._generation = (self._generation or 0) + 1
+        self._vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self._vectors_file = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._assign = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._reserve(keep.size)
+        for start in range(0, keep.size, _BLOCK_ROWS):
+            block = keep[start : start + _BLOCK_ROWS]
+            self._vectors[start : start + block.size] = old_vectors[block]
+        self._size = keep.size
+        self._ids, self._metadata = ids, metadata
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._alive[: self._size] = True
+        self._assign[: self._size] = assign
+        self._assigned = self._size
+        self._lists = None
+        self._log_bytes = 0
+        self._pending_log = [
+            json.dumps({"i": doc_id, "m": meta}, separators=(",", ":")) + "\n" for doc_id, meta in zip(ids, metadata)
+        ]
+        self._ivf_dirty = self._centroids is not None
+
+    def save(self) -> None:
+        with self._lock:
+            dead = self._size - len(self._rows)
+            needs_compaction = dead > _COMPACT_RATIO * max(self._size, 1)
+            if not self.path:
+                if needs_compaction:
+                    self._compact()
+                return
+            if not self._dirty:
+                # Nothing changed (e.g. a delete on an empty namespace); writing this view could also undo
+                # another process's save.
+                self._writer.release()
+                return
+            if self._generation is None or needs_compaction:
+                self._compact()
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+
+            log_file = f"log-{self._generation}.jsonl"
+            with open(os.path.join(self.path, log_file), "ab") as f:
+                # Drop anything a writer that died mid-save appended past the committed end.
+                f.truncate(self._log_bytes)
+                f.write("".join(self._pending_log).encode("utf-8"))
+                self._log_bytes = f.tell()
+            self._pending_log = []
+
+            if self._ivf_dirty:
+                self._ivf_file = f"ivf-{self._generation}-{self._size}.npz"
+                tmp = os.path.join(self.path, "ivf.tmp.npz")
+                np.savez(tmp, centroids=self._centroids, assign=self._assign[: self._size], trained=self._trained_size)
+                os.replace(tmp, os.path.join(self.path, self._ivf_file))
+                self._ivf_dirty = False
+
+            # The state file is written last; other processes reload when it changes.
+            state = {
+                "generation": self._generation,
+                "dimension": self.dimension,
+                "rows": self._size,
+                "vectors": self._vectors_file,
+                "log": log_file,
+                "log_bytes": self._log_bytes,
+                "ivf": self._ivf_file,
+            }
+            state_path = os.path.join(self.path, _STATE_FILE)
+            with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(state_path + ".tmp", state_path)
+            self._loaded_key = self._state_key()
+            self._remove_unused_files(state)
+            self._map_vectors("r")
+            self._dirty = False
+            self._writer.release()
+
+    def _remove_unused_files(self, state: dict) -> None:
+        keep = {_STATE_FILE, _LOCK_FILE, state["vectors"], state["log"], state["ivf"]}
+        for name in os.listdir(self.path):
+            if name not in keep and not name.endswith(".tmp") and not name.endswith(".tmp.npz"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def _map_vectors(self, mode: str) -> None:
+        if self._vectors_file is not None and getattr(self._vectors, "mode", mode) != mode:
+            self._vectors = np.load(os.path.join(self.path, self._vectors_file), mmap_mode=mode)
+
+    def _state_key(self) -> tuple | None:
+        for name in (_STATE_FILE, _LEGACY_META_FILE):
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            return name, st.st_ino, st.st_mtime_ns, st.st_size
+        return None
+
+    def load(self) -> None:
+        with self._lock:
+            key = self._state_key()
+            if key is None:
+                return
+            if key[0] == _LEGACY_META_FILE:
+                self._load_legacy(key)
+                return
+            with open(os.path.join(self.path, _STATE_FILE), encoding="utf-8") as f:
+                state = json.load(f)
+            try:
+                files = self._read_state_files(state)
+            except FileNotFoundError:
+                # A writer compacted in between; keep the current view until the next refresh.
+                return
+            if state["generation"] != self._generation:
+                self._reset()
+            self._apply(state, *files)
+            self._loaded_key = key
+
+    def _read_state_files(self, state: dict) -> tuple:
+        # Everything is opened before the view changes, so a missing file leaves it untouched.
+        same_generation = state["generation"] == self._generation
+        vectors = None
+        if not same_generation or state["vectors"] != self._vectors_file:
+            if state["vectors"] is not None:
+                vectors = np.load(os.path.join(self.path, state["vectors"]), mmap_mode="r")
+        log_start = self._log_bytes if same_generation else 0
+        log = b""
+        if state["log_bytes"] > log_start:
+            with open(os.path.join(self.path, state["log"]), "rb") as f:
+                f.seek(log_start)
+                log = f.read(state["log_bytes"] - log_start)
+        ivf = None
+        if state["ivf"] is not None and (not same_generation or state["ivf"] != self._ivf_file):
+            with np.load(os.path.join(self.path, state["ivf"])) as data:
+                ivf = {name: data[name] for name in ("centroids", "assign", "trained")}
+        return vectors, log, ivf
+
+    def _apply(self, state: dict, vectors: np.ndarray | None, log: bytes, ivf: dict | None) -> None:
+        self.dimension = state["dimension"]
+        self._generation = state["generation"]
+        if vectors is not None:
+            self._vectors, self._vectors_file = vectors, state["vectors"]
+            self._grow_rows(vectors.shape[0])
+        for line in log.decode("utf-8").splitlines():
+            record = json.loads(line)
+            if "d" in record:
+                row = record["d"]
+                self._alive[row] = False
+                self._rows.pop(self._ids[row], None)
+            else:
+                row = self._size
+                self._size += 1
+                self._ids.append(record["i"])
+                self._metadata.append(record["m"])
+                self._alive[row] = True
+                self._rows[record["i"]] = row
+        self._log_bytes = state["log_bytes"]
+        self._lists = None
+        if ivf is not None:
+            self._centroids = ivf["centroids"]
+            assigned = ivf["assign"].shape[0]
+            self._assign[:assigned] = ivf["assign"]
+            self._assigned = assigned
+            self._trained_size = int(ivf["trained"])
+            self._ivf_file = state["ivf"]
+        self._assign_rows()
+
+    def _load_legacy(self, key: tuple) -> None:
+        with open(os.path.join(self.path, _LEGACY_META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self._reset()
+        vectors_path = os.path.join(self.path, _LEGACY_VECTORS_FILE)
+        if meta["size"] and os.path.exists(vectors_path):
+            self.dimension = meta["dimension"]
+            self._vectors = np.load(vectors_path, mmap_mode="r")
+            self._vectors_file = _LEGACY_VECTORS_FILE
+            self._grow_rows(self._vectors.shape[0])
+            self._size = meta["size"]
+            self._ids = meta["ids"]
+            self._metadata = meta["metadata"]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._alive[: self._size] = True
+            ivf_path = os.path.join(self.path, _LEGACY_IVF_FILE)
+            if os.path.exists(ivf_path):
+                with np.load(ivf_path) as ivf:
+                    if ivf["assign"].shape[0] == self._size:
+                        self._centroids = ivf["centroids"]
+                        self._assign[: self._size] = ivf["assign"]
+                        self._assigned = self._size
+                        self._trained_size = int(ivf["trained"])
+        self._loaded_key = key
+
+    def refresh(self) -> None:
+        # Pick up changes written by another process; a stat call per query is cheap.
+        if self.path and self._state_key() != self._loaded_key:
+            self.load()
+
+    def _refresh_for_write(self) -> None:
+        self.refresh()
+        self._map_vectors("r+")
@@ -0,0 +1,184 @@
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "pinecone" (remote serverless index) or "local" (in-process NumPy index persisted under LOCAL_INDEX_DIR).
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/vector_index")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX")
+INDEX_METRIC = "cosine"
+# Pinecone accepts at most 1000 ids per delete request.
+PINECONE_DELETE_BATCH = 1000
+
+
+class VectorStore:
+    """Vector storage used by pinecone_service. Methods are blocking; callers run them in a worker thread."""
+
+    name = "base"
+    # Distinguishes stores in the chunk registry, so switching stores doesn't skip chunks the new one lacks.
+    identity = "base"
+
+    def upsert(self, vectors: list[dict], namespace: str = "") -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: list[str], namespace: str = "") -> None:
+        raise NotImplementedError
+
+    def flush(self, namespace: str = "") -> None:
+        # Persist buffered writes; called once after a batch of upserts/deletes.
+        return None
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict | None = None) -> list[dict]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        raise NotImplementedError
+
+    def ensure(self, dimension: int) -> None:
+        return None
+
+
+class PineconeIndexStore(VectorStore):
+    name = "pinecone"
+
+    def __init__(self, api_key: str, index_name: str):
+        from pinecone import Pinecone
+
+        self.index_name = index_name
+        self.identity = f"pinecone:{index_name}"
+        self._pc = Pinecone(api_key=api_key)
+        self._index = self._pc.Index(index_name)
+
+    def upsert(self, vectors: list[dict], namespace: str = "") -> None:
+        self._index.upsert(vectors=vectors, namespace=namespace)
+
+    def delete(self, ids: list[str], namespace: str = "") -> None:
+        for start in range(0, len(ids), PINECONE_DELETE_BATCH):
+            self._index.delete(ids=ids[start : start + PINECONE_DELETE_BATCH], namespace=namespace)
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict | None = None) -> list[dict]:
+        results = self._index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=namespace,
+            filter=filter,
+        )
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": dict(match.get("metadata") or {})}
+            for match in results["matches"]
+        ]
+
+    def count(self) -> int:
+        return self._index.describe_index_stats().get("total_vector_count", 0)
+
+    def describe(self) -> dict:
+        index_desc = self._pc.describe_index(self.index_name)
+        return {
+            "index_name": self.index_name,
+            "dimension": index_desc.dimension,
+            "metric": index_desc.metric,
+            "endpoint": f"https://{index_desc.host}",
+        }
+
+    def ensure(self, dimension: int) -> None:
+        from pinecone import ServerlessSpec
+
+        existing_indexes = self._pc.list_indexes()
+        if self.index_name not in [idx["name"] for idx in existing_indexes]:
+            self._pc.create_index(
+                name=self.index_name,
+                dimension=dimension,
+                metric=INDEX_METRIC,
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+            )
+
+
+class LocalIndexStore(VectorStore):
+    """One LocalVectorIndex per namespace, each in its own directory under ``root``."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        self.identity = f"local:{os.path.abspath(root)}"
+        self._indexes: dict = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _index_for(self, namespace: str):
+        from vector_index import LocalVectorIndex
+
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                dirname = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace) or "__default__"
+                index = LocalVectorIndex(os.path.join(self.root, dirname))
+                self._indexes[namespace] = index
+            return index
+
+    def upsert(self, vectors: list[dict], namespace: str = "") -> None:
+        self._index_for(namespace).upsert(
+            [v["id"] for v in vectors],
+            [v["values"] for v in vectors],
+            [v.get("metadata") or {} for v in vectors],
+            save=False,
+        )
+
+    def delete(self, ids: list[str], namespace: str = "") -> None:
+        self._index_for(namespace).delete(ids, save=False)
+
+    def flush(self, namespace: str = "") -> None:
+        self._index_for(namespace).save()
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict | None = None) -> list[dict]:
+        index = self._index_for(namespace)
+        index.refresh()
+        return [
+            {"id": doc_id, "score": score, "metadata": dict(metadata)}
+            for doc_id, score, metadata in index.search(vector, top_k=top_k, filter=filter)
+        ]
+
+    def _load_all(self) -> None:
+        for dirname in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, dirname)):
+                self._index_for("" if dirname == "__default__" else dirname)
+
+    def count(self) -> int:
+        self._load_all()
+        return sum(len(index) for index in self._indexes.values())
+
+    def describe(self) -> dict:
+        self._load_all()
+        stats = {ns or "__default__": index.stats() for ns, index in self._indexes.items()}
+        dimensions = [s["dimension"] for s in stats.values() if s["dimension"]]
+        return {
+            "index_name": "local",
+            "dimension": dimensions[0] if dimensions else None,
+            "metric": INDEX_METRIC,
+            "endpoint": os.path.abspath(self.root),
+            "namespaces": stats,
+        }
+
+    def ensure(self, dimension: int) -> None:
+        # Map existing namespaces at startup so the first query doesn't pay for it.
+        self._load_all()
+
+
+def create_store(api_key: str | None) -> VectorStore:
+    if VECTOR_STORE == "local":
+        return LocalIndexStore(LOCAL_INDEX_DIR)
+    if VECTOR_STORE == "pinecone":
+        if not api_key:
+            raise ValueError("PINECONE_API_KEY environment variable not set")
+        if not PINECONE_INDEX_NAME:
+            raise ValueError("PINECONE_INDEX environment variable not set")
+        return PineconeIndexStore(api_key, PINECONE_INDEX_NAME)
+    raise ValueError(f"Unknown VECTOR_STORE: {VECTOR_STORE}")
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+import file_processor
+import ingestion_jobs
+import pinecone_service
+import redis_cache
+import repositories
+
+
+async def main() -> None:
+    await repositories.ensure_indexes()
+    pinecone_service.ensure_index()
+    await ingestion_jobs.start_workers()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await ingestion_jobs.stop_workers()
+        await redis_cache.aclose()
+        pinecone_service.close()
+        file_processor.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())